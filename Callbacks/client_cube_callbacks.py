@@ -0,0 +1,28 @@
+from dash import Input, Output
+import plotly.graph_objects as go
+from metrics import instrumented
+from Callbacks.first_callbacks import loan_chart_template
+from Callbacks.third_callbacks import risk_chart_template
+from Callbacks.fourth_callbacks import sunburst_chart_template
+from Callbacks.fifth_callbacks import bar_chart_template
+
+
+def register_client_cube_callbacks(app, data_loader):
+    """Send the client cube and chart templates to the browser on page load and after each reload"""
+
+    @app.callback(
+        Output("client-cube", "data"),
+        Input("app-state", "data"),
+    )
+    @instrumented
+    def update_client_cube(app_state):
+        cube = data_loader.get_client_cube()
+        grades = cube["projections"].get("grades", {}).get("labels", {}).get("grade", [])
+        cube["templates"] = {
+            "plotly": go.Figure().layout.template.to_plotly_json(),
+            "loanChart": loan_chart_template(grades),
+            "riskChart": risk_chart_template(),
+            "sunburstChart": sunburst_chart_template(),
+            "barChart": bar_chart_template(),
+        }
+        return cube
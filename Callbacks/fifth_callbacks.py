@@ -1,121 +1,173 @@
-from dash import Input, Output, State
+from dash import ClientsideFunction, Input, Output, State
 import plotly.graph_objects as go
+from cache import cached_figure
+from metrics import instrumented, record_empty, record_error
+from layout.fifth_layout import BAR_VARIABLE_OPTIONS
+
+TOP_N = 30
+
+VARIABLE_LABELS = {
+    "purpose": "Purpose",
+    "home_ownership": "Home Ownership",
+    "emp_length": "Employment Length",
+}
+
+BAR_STYLE = dict(
+    orientation="h",
+    marker_color="#4CAF50",
+    texttemplate="%{x:,}",
+    textposition="outside",
+    hovertemplate="<b>%{y}</b><br>Count: %{x:,}<extra></extra>",
+)
+
+
+def bar_chart_layout(variable):
+    return dict(
+        title=dict(
+            text=f"Count by {VARIABLE_LABELS.get(variable, variable)}",
+            font=dict(color="white", size=18),
+            x=0.5,
+            xanchor="center",
+        ),
+        xaxis=dict(
+            gridcolor="#333",
+            tickfont=dict(color="#aaa"),
+            title_font=dict(color="white"),
+        ),
+        yaxis=dict(
+            tickfont=dict(color="white"),
+            automargin=True,
+        ),
+        plot_bgcolor="#0a0a0a",
+        paper_bgcolor="#0a0a0a",
+        height=500,
+        margin=dict(l=10, r=80, t=80, b=50),
+        showlegend=False,
+    )
 
-def register_bar_chart_callbacks(app, data_loader):
 
-    @app.callback(
-        Output("barChart-graph", "figure"),
+def empty_figure_layout(title, message):
+    return dict(
+        title=dict(text=title, font=dict(color="white")),
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False),
+        plot_bgcolor="#0a0a0a",
+        paper_bgcolor="#0a0a0a",
+        annotations=[
+            dict(
+                text=message,
+                x=0.5,
+                y=0.5,
+                xref="paper",
+                yref="paper",
+                showarrow=False,
+                font=dict(color="#aaa", size=14),
+            )
+        ],
+        height=500,
+    )
+
+
+def bar_chart_template():
+    """Trace style and per-variable layouts the browser-side bar chart draws with"""
+    variables = [option["value"] for option in BAR_VARIABLE_OPTIONS]
+    return {
+        "top_n": TOP_N,
+        "trace": go.Bar(**BAR_STYLE).to_plotly_json(),
+        "layouts": {variable: go.Layout(bar_chart_layout(variable)).to_plotly_json() for variable in variables},
+        "no_data": {
+            variable: go.Layout(
+                empty_figure_layout("No Data", f"No data for {variable} or selected date range")
+            ).to_plotly_json()
+            for variable in variables
+        },
+    }
+
+
+def register_bar_chart_callbacks(app, data_loader, figure_cache=None, client_side=False):
+    """Register bar chart callbacks, drawn in the browser when client_side is set"""
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="barFilterState"),
         Output("barChart-filterStore", "data"),
         Input("barChart-variableDropdown", "value"),
         Input("barChart-dateRange", "start_date"),
         Input("barChart-dateRange", "end_date"),
         State("barChart-filterStore", "data"),
     )
-    def update_bar_chart_figure(selected_variable, start_date, end_date, filter_state):
-
-        filter_state = filter_state or {}
-        filter_state.update(
-            {
-                "variable": selected_variable,
-                "start_date": start_date,
-                "end_date": end_date,
-            }
-        )
 
-        figure = generate_bar_chart_figure(
-            selected_variable, start_date, end_date
+    if client_side:
+        app.clientside_callback(
+            ClientsideFunction(namespace="clientFiltering", function_name="barChart"),
+            Output("barChart-graph", "figure"),
+            Input("barChart-variableDropdown", "value"),
+            Input("barChart-dateRange", "start_date"),
+            Input("barChart-dateRange", "end_date"),
+            Input("client-cube", "data"),
         )
+        return
 
-        return figure, filter_state
+    @app.callback(
+        Output("barChart-graph", "figure"),
+        Input("barChart-variableDropdown", "value"),
+        Input("barChart-dateRange", "start_date"),
+        Input("barChart-dateRange", "end_date"),
+        Input("app-state", "data"),
+    )
+    @instrumented
+    def update_bar_chart_figure(selected_variable, start_date, end_date, app_state):
+        return generate_bar_chart_figure(selected_variable, start_date, end_date)
 
     def generate_bar_chart_figure(variable, start_date, end_date):
         try:
-            grouped_df = data_loader.get_bar_chart_data(
-                variable, start_date, end_date, top_n=30
+            return cached_figure(
+                figure_cache,
+                "barChart-graph",
+                {
+                    "variable": variable,
+                    "start_date": start_date,
+                    "end_date": end_date,
+                },
+                data_loader.version,
+                lambda: build_bar_chart_figure(variable, start_date, end_date),
             )
+        except Exception as error:
+            return create_error_figure(str(error))
 
-            if grouped_df.empty:
-                return create_empty_figure(
-                    "No Data", f"No data for {variable} or selected date range"
-                )
-
-            grouped_df = grouped_df.drop_duplicates(subset=[variable]).sort_values(
-                "total_amount", ascending=True
-            )
+    def build_bar_chart_figure(variable, start_date, end_date):
+        grouped_df = data_loader.get_bar_chart_data(
+            variable, start_date, end_date, top_n=TOP_N
+        )
 
-            y_values = grouped_df[variable].astype(str).tolist()
-            x_values = grouped_df["loan_count"].tolist()
-
-            fig = go.Figure(
-                go.Bar(
-                    y=y_values,
-                    x=x_values,
-                    orientation="h",
-                    marker_color="#4CAF50",
-                    text=[f"{x:,}" for x in x_values],
-                    textposition="outside",
-                    hovertemplate="<b>%{y}</b><br>Count: %{x:,}<extra></extra>",
-                )
+        if grouped_df.empty:
+            return create_empty_figure(
+                "No Data", f"No data for {variable} or selected date range"
             )
 
-            variable_labels = {
-                "purpose": "Purpose",
-                "home_ownership": "Home Ownership",
-                "emp_length": "Employment Length",
-            }
+        grouped_df = grouped_df.drop_duplicates(subset=[variable]).sort_values(
+            "total_amount", ascending=True
+        )
 
-            fig.update_layout(
-                title=dict(
-                    text=f"Count by {variable_labels.get(variable, variable)}",
-                    font=dict(color="white", size=18),
-                    x=0.5,
-                    xanchor="center",
-                ),
-                xaxis=dict(
-                    gridcolor="#333",
-                    tickfont=dict(color="#aaa"),
-                    title_font=dict(color="white"),
-                ),
-                yaxis=dict(
-                    tickfont=dict(color="white"),
-                    automargin=True,
-                ),
-                plot_bgcolor="#0a0a0a",
-                paper_bgcolor="#0a0a0a",
-                height=500,
-                margin=dict(l=10, r=80, t=80, b=50),
-                showlegend=False,
+        fig = go.Figure(
+            go.Bar(
+                y=grouped_df[variable].astype(str),
+                x=grouped_df["loan_count"],
+                **BAR_STYLE,
             )
+        )
 
-            return fig
+        fig.update_layout(**bar_chart_layout(variable))
 
-        except Exception as error:
-            return create_error_figure(str(error))
+        return fig
 
     def create_empty_figure(title, message):
+        record_empty()
         fig = go.Figure()
-        fig.update_layout(
-            title=dict(text=title, font=dict(color="white")),
-            xaxis=dict(visible=False),
-            yaxis=dict(visible=False),
-            plot_bgcolor="#0a0a0a",
-            paper_bgcolor="#0a0a0a",
-            annotations=[
-                dict(
-                    text=message,
-                    x=0.5,
-                    y=0.5,
-                    xref="paper",
-                    yref="paper",
-                    showarrow=False,
-                    font=dict(color="#aaa", size=14),
-                )
-            ],
-            height=500,
-        )
+        fig.update_layout(**empty_figure_layout(title, message))
         return fig
 
     def create_error_figure(error_message):
+        record_error()
         fig = go.Figure()
         fig.update_layout(
             title=dict(text="Error", font=dict(color="white")),
@@ -138,3 +190,10 @@ def register_bar_chart_callbacks(app, data_loader):
         )
         return fig
 
+    def warm_default_figures():
+        start_date, end_date = data_loader.get_date_range()
+        for option in BAR_VARIABLE_OPTIONS:
+            generate_bar_chart_figure(option["value"], start_date, end_date)
+
+    if figure_cache is not None:
+        figure_cache.add_warmer(warm_default_figures)
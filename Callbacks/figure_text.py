@@ -0,0 +1,17 @@
+def hover_customdata(df, fields, header=None):
+    """Numeric customdata columns plus a hovertemplate that formats them in the browser
+
+    fields is a sequence of (label, column, d3_format, prefix, suffix) tuples;
+    prefix and suffix may be omitted.
+    """
+    import numpy as np
+
+    columns = []
+    lines = [header] if header else []
+    for position, (label, column, number_format, *affixes) in enumerate(fields):
+        prefix, suffix = (list(affixes) + ["", ""])[:2]
+        columns.append(df[column].to_numpy(dtype=np.float64, na_value=np.nan))
+        lines.append(f"{label}: {prefix}%{{customdata[{position}]:{number_format}}}{suffix}")
+
+    customdata = np.column_stack(columns) if columns else None
+    return customdata, "<br>".join(lines) + "<extra></extra>"
@@ -1,39 +1,145 @@
-from dash import Input, Output, State
+from dash import ClientsideFunction, Input, Output, State
 import plotly.graph_objects as go
+from cache import cached_figure
+from metrics import instrumented, record_empty, record_error
+
+DEFAULT_GRADES = ["A", "B", "C", "D", "E"]
+
+GRADE_COLORS = {
+    "A": "#1B5E20",
+    "B": "#4CAF50",
+    "C": "#FBC02D",
+    "D": "#FB8C00",
+    "E": "#E53935",
+    "F": "#8E24AA",
+    "G": "#546E7A",
+}
+
+LOAN_CHART_LAYOUT = dict(
+    title=dict(
+        text="Monthly Loan Amount by Grade",
+        font=dict(color="white", size=18),
+        x=0.5,
+        xanchor="center",
+    ),
+    xaxis=dict(
+        tickformat="%Y-%m",
+        tickfont=dict(color="#aaa"),
+        showgrid=False,
+    ),
+    yaxis=dict(
+        tickfont=dict(color="white"),
+        gridcolor="gray",
+    ),
+    hovermode="closest",
+    plot_bgcolor="rgba(0,0,0,0)",
+    paper_bgcolor="rgba(0,0,0,0)",
+    legend=dict(
+        orientation="h",
+        x=0.5,
+        xanchor="center",
+        y=0.93,
+        font=dict(color="white"),
+        bgcolor="rgba(0,0,0,0)",
+    ),
+    height=500,
+)
+
+
+def loan_trace_style(grade):
+    return dict(
+        mode="lines+markers",
+        name=f"Grade {grade}",
+        line=dict(
+            color=GRADE_COLORS.get(grade, "#636efa"),
+            width=2.5,
+        ),
+        marker=dict(size=8),
+        hovertemplate=(
+            f"<b>Grade {grade}</b><br>"
+            "Month: %{x|%Y-%m}<br>"
+            "Loan Amount: %{y:,.0f}<br>"
+            "<extra></extra>"
+        ),
+    )
 
-def register_loan_chart_callbacks(app, data_loader):
-    """Register loan chart callbacks"""
 
-    @app.callback(
-        Output("loanChart-graph", "figure"),
+def empty_figure_layout(title, message):
+    return dict(
+        title=dict(text=title, font=dict(color="white")),
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False),
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        annotations=[
+            dict(
+                text=message,
+                x=0.5,
+                y=0.5,
+                xref="paper",
+                yref="paper",
+                showarrow=False,
+                font=dict(color="#aaa", size=14),
+            )
+        ],
+        height=500,
+    )
+
+
+def loan_chart_template(grades):
+    """Trace styles and layouts the browser-side loan chart draws with"""
+    return {
+        "default_grades": DEFAULT_GRADES,
+        "traces": {grade: go.Scatter(**loan_trace_style(grade)).to_plotly_json() for grade in grades},
+        "layout": go.Layout(LOAN_CHART_LAYOUT).to_plotly_json(),
+        "no_grades": go.Layout(
+            empty_figure_layout("No grades selected", "Please select at least one grade")
+        ).to_plotly_json(),
+        "no_data": go.Layout(
+            empty_figure_layout("No data for selected filters", "Adjust filters or try different dates/grades")
+        ).to_plotly_json(),
+    }
+
+
+def register_loan_chart_callbacks(app, data_loader, figure_cache=None, client_side=False):
+    """Register loan chart callbacks, drawn in the browser from the client cube when client_side is set"""
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="loanFilterState"),
         Output("loanChart-filterStore", "data"),
         Input("loanChart-gradeDropdown", "value"),
         Input("loanChart-dateRange", "start_date"),
         Input("loanChart-dateRange", "end_date"),
+        State("loanChart-gradeDropdown", "options"),
         State("loanChart-filterStore", "data"),
     )
-    def update_loan_chart(
-        selected_grades, start_date, end_date, filter_state
-    ):
 
-        if not selected_grades:
-            all_grades = data_loader.get_unique_grades()
-            selected_grades = [g for g in all_grades if g in ["A", "B", "C", "D", "E"]]
-
-        filter_state = filter_state or {}
-        filter_state.update(
-            {
-                "grades": selected_grades,
-                "start_date": start_date,
-                "end_date": end_date,
-            }
+    if client_side:
+        app.clientside_callback(
+            ClientsideFunction(namespace="clientFiltering", function_name="loanChart"),
+            Output("loanChart-graph", "figure"),
+            Input("loanChart-gradeDropdown", "value"),
+            Input("loanChart-dateRange", "start_date"),
+            Input("loanChart-dateRange", "end_date"),
+            Input("client-cube", "data"),
         )
+        return
 
-        figure = generate_loan_chart_figure(
-            selected_grades, start_date, end_date
-        )
+    @app.callback(
+        Output("loanChart-graph", "figure"),
+        Input("loanChart-gradeDropdown", "value"),
+        Input("loanChart-dateRange", "start_date"),
+        Input("loanChart-dateRange", "end_date"),
+        Input("app-state", "data"),
+    )
+    @instrumented
+    def update_loan_chart(selected_grades, start_date, end_date, app_state):
+
+        if not selected_grades:
+            all_grades = data_loader.get_unique_grades()
+            selected_grades = [g for g in all_grades if g in DEFAULT_GRADES]
 
-        return figure, filter_state
+        return generate_loan_chart_figure(selected_grades, start_date, end_date)
 
     def generate_loan_chart_figure(selected_grades, start_date, end_date):
         if not selected_grades:
@@ -43,109 +149,55 @@ def register_loan_chart_callbacks(app, data_loader):
             )
 
         try:
-            pivot_df = data_loader.get_monthly_data(
-                start_date, end_date, selected_grades
+            return cached_figure(
+                figure_cache,
+                "loanChart-graph",
+                {
+                    "selected_grades": selected_grades,
+                    "start_date": start_date,
+                    "end_date": end_date,
+                },
+                data_loader.version,
+                lambda: build_loan_chart_figure(selected_grades, start_date, end_date),
             )
+        except Exception as error:
+            return create_error_figure(str(error))
 
-            if pivot_df.empty:
-                return create_empty_figure(
-                    "No data for selected filters",
-                    "Adjust filters or try different dates/grades",
-                )
-
-            fig = go.Figure()
-
-            grade_colors = {
-                "A": "#1B5E20",
-                "B": "#4CAF50",
-                "C": "#FBC02D",
-                "D": "#FB8C00",
-                "E": "#E53935",
-                "F": "#8E24AA",
-                "G": "#546E7A",
-            }
-
-            for grade in selected_grades:
-                if grade in pivot_df.columns:
-                    fig.add_trace(
-                        go.Scatter(
-                            x=pivot_df.index,
-                            y=pivot_df[grade],
-                            mode="lines+markers",
-                            name=f"Grade {grade}",
-                            line=dict(
-                                color=grade_colors.get(grade, "#636efa"),
-                                width=2.5,
-                            ),
-                            marker=dict(size=8),
-                            hovertemplate=(
-                                f"<b>Grade {grade}</b><br>"
-                                "Month: %{x|%Y-%m}<br>"
-                                "Loan Amount: %{y:,.0f}<br>"
-                                "<extra></extra>"
-                            ),
-                        )
-                    )
+    def build_loan_chart_figure(selected_grades, start_date, end_date):
+        pivot_df = data_loader.get_monthly_data(
+            start_date, end_date, selected_grades
+        )
 
-            fig.update_layout(
-                title=dict(
-                    text="Monthly Loan Amount by Grade",
-                    font=dict(color="white", size=18),
-                    x=0.5,
-                    xanchor="center",
-                ),
-                xaxis=dict(
-                    tickformat="%Y-%m",
-                    tickfont=dict(color="#aaa"),
-                    showgrid=False,
-                ),
-                yaxis=dict(
-                    tickfont=dict(color="white"),
-                    gridcolor="gray",
-                ),
-                hovermode="closest",
-                plot_bgcolor="rgba(0,0,0,0)",
-                paper_bgcolor="rgba(0,0,0,0)",
-                legend=dict(
-                    orientation="h",
-                    x=0.5,
-                    xanchor="center",
-                    y=0.93,
-                    font=dict(color="white"),
-                    bgcolor="rgba(0,0,0,0)",
-                ),
-                height=500,
+        if pivot_df.empty:
+            return create_empty_figure(
+                "No data for selected filters",
+                "Adjust filters or try different dates/grades",
             )
 
-            return fig
+        fig = go.Figure()
 
-        except Exception as error:
-            return create_error_figure(str(error))
+        for grade in selected_grades:
+            if grade in pivot_df.columns:
+                fig.add_trace(
+                    go.Scatter(
+                        x=pivot_df.index,
+                        y=pivot_df[grade],
+                        **loan_trace_style(grade),
+                    )
+                )
+
+        fig.update_layout(**LOAN_CHART_LAYOUT)
+
+        return fig
 
     def create_empty_figure(title, message):
+        record_empty()
         fig = go.Figure()
-        fig.update_layout(
-            title=dict(text=title, font=dict(color="white")),
-            xaxis=dict(visible=False),
-            yaxis=dict(visible=False),
-            plot_bgcolor="rgba(0,0,0,0)",
-            paper_bgcolor="rgba(0,0,0,0)",
-            annotations=[
-                dict(
-                    text=message,
-                    x=0.5,
-                    y=0.5,
-                    xref="paper",
-                    yref="paper",
-                    showarrow=False,
-                    font=dict(color="#aaa", size=14),
-                )
-            ],
-            height=500,
-        )
+        fig.update_layout(**empty_figure_layout(title, message))
         return fig
 
     def create_error_figure(error_message):
+        record_error()
         fig = go.Figure()
         fig.update_layout(
             title=dict(text="Error", font=dict(color="white")),
@@ -168,3 +220,12 @@ def register_loan_chart_callbacks(app, data_loader):
         )
         return fig
 
+    def warm_default_figures():
+        start_date, end_date = data_loader.get_date_range()
+        default_grades = [
+            g for g in data_loader.get_unique_grades() if g in DEFAULT_GRADES
+        ]
+        generate_loan_chart_figure(default_grades, start_date, end_date)
+
+    if figure_cache is not None:
+        figure_cache.add_warmer(warm_default_figures)
@@ -1,116 +1,155 @@
-from dash import Input, Output, State
+from dash import ClientsideFunction, Input, Output, State
 import plotly.graph_objects as go
+from cache import cached_figure
+from metrics import instrumented, record_empty, record_error
+
+GRADE_COLORS = {
+    "A": "#1E88E5",
+    "B": "#43A047",
+    "C": "#FDD835",
+    "D": "#FB8C00",
+    "E": "#E53935",
+    "F": "#8E24AA",
+    "G": "#546E7A",
+}
+
+SUNBURST_STYLE = dict(
+    branchvalues="total",
+    hovertemplate=(
+        "<b>%{label}</b><br>"
+        "Loan Amount: %{value:,.0f}<br>"
+        "<extra></extra>"
+    ),
+    maxdepth=2,
+)
+
+SUNBURST_LAYOUT = dict(
+    title=dict(
+        text="Loan Amount by Grade and Subgrade",
+        font=dict(color="white", size=18),
+        x=0.5,
+        xanchor="center",
+    ),
+    paper_bgcolor="#0a0a0a",
+    plot_bgcolor="#0a0a0a",
+    margin=dict(l=0, r=0, t=60, b=0),
+    height=500,
+)
+
+
+def empty_figure_layout(title, message):
+    return dict(
+        title=dict(text=title, font=dict(color="white")),
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False),
+        paper_bgcolor="#0a0a0a",
+        plot_bgcolor="#0a0a0a",
+        annotations=[
+            dict(
+                text=message,
+                x=0.5,
+                y=0.5,
+                xref="paper",
+                yref="paper",
+                showarrow=False,
+                font=dict(color="#aaa", size=14),
+            )
+        ],
+        height=500,
+    )
 
-def register_sunburst_chart_callbacks(app, data_loader):
 
-    @app.callback(
-        Output("sunburstChart-graph", "figure"),
+def sunburst_chart_template():
+    """Trace style, colors and layouts the browser-side sunburst draws with"""
+    return {
+        "colors": GRADE_COLORS,
+        "default_color": "#1B5E20",
+        "trace": go.Sunburst(marker=dict(line=dict(color="#111", width=1)), **SUNBURST_STYLE).to_plotly_json(),
+        "layout": go.Layout(SUNBURST_LAYOUT).to_plotly_json(),
+        "no_data": go.Layout(empty_figure_layout("No Data", "No data for selected date range")).to_plotly_json(),
+    }
+
+
+def register_sunburst_chart_callbacks(app, data_loader, figure_cache=None, client_side=False):
+    """Register sunburst chart callbacks, drawn in the browser when client_side is set"""
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="dateFilterState"),
         Output("sunburstChart-filterStore", "data"),
         Input("sunburstChart-dateRange", "start_date"),
         Input("sunburstChart-dateRange", "end_date"),
         State("sunburstChart-filterStore", "data"),
     )
-    def update_sunburst_chart(start_date, end_date, filter_state):
 
-        filter_state = filter_state or {}
-        filter_state.update(
-            {"start_date": start_date, "end_date": end_date}
+    if client_side:
+        app.clientside_callback(
+            ClientsideFunction(namespace="clientFiltering", function_name="sunburstChart"),
+            Output("sunburstChart-graph", "figure"),
+            Input("sunburstChart-dateRange", "start_date"),
+            Input("sunburstChart-dateRange", "end_date"),
+            Input("client-cube", "data"),
         )
+        return
 
-        fig = generate_sunburst_chart_figure(start_date, end_date)
-
-        return fig, filter_state
+    @app.callback(
+        Output("sunburstChart-graph", "figure"),
+        Input("sunburstChart-dateRange", "start_date"),
+        Input("sunburstChart-dateRange", "end_date"),
+        Input("app-state", "data"),
+    )
+    @instrumented
+    def update_sunburst_chart(start_date, end_date, app_state):
+        return generate_sunburst_chart_figure(start_date, end_date)
 
     def generate_sunburst_chart_figure(start_date, end_date):
         try:
-            sunburst_df = data_loader.get_sunburst_data(start_date, end_date)
-
-            if sunburst_df.empty:
-                return create_empty_figure(
-                    "No Data", "No data for selected date range"
-                )
+            return cached_figure(
+                figure_cache,
+                "sunburstChart-graph",
+                {"start_date": start_date, "end_date": end_date},
+                data_loader.version,
+                lambda: build_sunburst_chart_figure(start_date, end_date),
+            )
+        except Exception as error:
+            return create_error_figure(str(error))
 
-            grade_colors = {
-                "A": "#1E88E5",
-                "B": "#43A047",
-                "C": "#FDD835",
-                "D": "#FB8C00",
-                "E": "#E53935",
-                "F": "#8E24AA",
-                "G": "#546E7A",
-            }
-
-            colors = []
-            for _, row in sunburst_df.iterrows():
-                parent = row["parent"]
-                label = row["label"]
-                colors.append(
-                    grade_colors.get(label if parent == "" else parent, "#1B5E20")
-                )
+    def build_sunburst_chart_figure(start_date, end_date):
+        sunburst_df = data_loader.get_sunburst_data(
+            start_date, end_date, colors=GRADE_COLORS
+        )
 
-            fig = go.Figure(
-                go.Sunburst(
-                    ids=sunburst_df["id"],
-                    labels=sunburst_df["label"],
-                    parents=sunburst_df["parent"],
-                    values=sunburst_df["value"],
-                    branchvalues="total",
-                    marker=dict(
-                        colors=colors,
-                        line=dict(color="#111", width=1),
-                    ),
-                    hovertemplate=(
-                        "<b>%{label}</b><br>"
-                        "Loan Amount: %{value:,.0f}<br>"
-                        "<extra></extra>"
-                    ),
-                    customdata=sunburst_df["loan_count"],
-                    maxdepth=2,
-                )
+        if sunburst_df.empty:
+            return create_empty_figure(
+                "No Data", "No data for selected date range"
             )
 
-            fig.update_layout(
-                title=dict(
-                    text="Loan Amount by Grade and Subgrade",
-                    font=dict(color="white", size=18),
-                    x=0.5,
-                    xanchor="center",
+        fig = go.Figure(
+            go.Sunburst(
+                ids=sunburst_df["id"],
+                labels=sunburst_df["label"],
+                parents=sunburst_df["parent"],
+                values=sunburst_df["value"],
+                marker=dict(
+                    colors=sunburst_df["color"],
+                    line=dict(color="#111", width=1),
                 ),
-                paper_bgcolor="#0a0a0a",
-                plot_bgcolor="#0a0a0a",
-                margin=dict(l=0, r=0, t=60, b=0),
-                height=500,
+                customdata=sunburst_df["loan_count"],
+                **SUNBURST_STYLE,
             )
+        )
 
-            return fig
+        fig.update_layout(**SUNBURST_LAYOUT)
 
-        except Exception as error:
-            return create_error_figure(str(error))
+        return fig
 
     def create_empty_figure(title, message):
+        record_empty()
         fig = go.Figure()
-        fig.update_layout(
-            title=dict(text=title, font=dict(color="white")),
-            xaxis=dict(visible=False),
-            yaxis=dict(visible=False),
-            paper_bgcolor="#0a0a0a",
-            plot_bgcolor="#0a0a0a",
-            annotations=[
-                dict(
-                    text=message,
-                    x=0.5,
-                    y=0.5,
-                    xref="paper",
-                    yref="paper",
-                    showarrow=False,
-                    font=dict(color="#aaa", size=14),
-                )
-            ],
-            height=500,
-        )
+        fig.update_layout(**empty_figure_layout(title, message))
         return fig
 
     def create_error_figure(error_message):
+        record_error()
         fig = go.Figure()
         fig.update_layout(
             title=dict(text="Error", font=dict(color="white")),
@@ -133,3 +172,8 @@ def register_sunburst_chart_callbacks(app, data_loader):
         )
         return fig
 
+    def warm_default_figures():
+        generate_sunburst_chart_figure(*data_loader.get_date_range())
+
+    if figure_cache is not None:
+        figure_cache.add_warmer(warm_default_figures)
@@ -0,0 +1,19 @@
+from dash import Input, Output, State, no_update
+from metrics import instrumented
+
+
+def register_reload_callbacks(app, data_loader):
+    """Publish the data version to app-state so charts redraw only after a reload"""
+
+    @app.callback(
+        Output("app-state", "data"),
+        Input("update-interval", "n_intervals"),
+        State("app-state", "data"),
+        prevent_initial_call=True,
+    )
+    @instrumented
+    def check_data_version(n_intervals, app_state):
+        version = data_loader.version
+        if (app_state or {}).get("version") == version:
+            return no_update
+        return {"version": version}
@@ -0,0 +1,11 @@
+from dash import ClientsideFunction, Input, Output
+
+
+def register_startup_callbacks(app):
+    """Poll /ready from the loading page and reload it once the data is available"""
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="reloadWhenReady"),
+        Output("startup-state", "data"),
+        Input("startup-poll", "n_intervals"),
+    )
@@ -1,52 +1,67 @@
-from dash import Input, Output, State, no_update, html
+from dash import ClientsideFunction, Input, Output, State, html
 import plotly.graph_objects as go
+from cache import cached_figure
+from metrics import instrumented, record_empty, record_error
+
+GRADE_TITLE = "Loan Amount by Grade"
+SUBGRADE_TITLE = "Loan Amount by Subgrade ({grade})"
+
+RISK_BAR_STYLE = dict(
+    marker_color="#388E3C",
+    texttemplate="%{y:,.0f}",
+    textposition="outside",
+)
+
+
+def risk_chart_layout(title):
+    return dict(
+        title=dict(text=title, font=dict(color="white")),
+        plot_bgcolor="#222",
+        paper_bgcolor="#222",
+        xaxis=dict(tickfont=dict(color="#aaa")),
+        yaxis=dict(tickfont=dict(color="white")),
+        height=400,
+    )
 
-def register_risk_subgrade_callbacks(app, data_loader):
-    """Register callbacks for risk subgrade analysis"""
 
-    @app.callback(
-        Output("riskChart-summaryStore", "data"),
-        Input("riskChart-dateRange", "start_date"),
-        Input("riskChart-dateRange", "end_date"),
-        Input("riskChart-gradeDropdown", "value"),
+def empty_figure_layout(message):
+    return dict(
+        title=dict(text=message, font=dict(color="white")),
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False),
+        plot_bgcolor="#222",
+        paper_bgcolor="#222",
+        height=400,
     )
-    def update_summary_data(start_date, end_date, selected_grade):
-        try:
-            df = data_loader.get_filtered_data(start_date, end_date)
-            if df.empty:
-                return {}
-
-            if "grade" not in df.columns and "sub_grade" in df.columns:
-                df["grade"] = df["sub_grade"].str[0]
-
-            summary = (
-                df.groupby("grade")["loan_amount"]
-                .sum()
-                .sort_index()
-                .to_dict()
-            )
 
-            return summary
 
-        except Exception:
-            return {}
+def risk_chart_template():
+    """Trace style and layouts the browser-side risk chart draws with"""
+    return {
+        "trace": go.Bar(**RISK_BAR_STYLE).to_plotly_json(),
+        "layout": go.Layout(risk_chart_layout(GRADE_TITLE)).to_plotly_json(),
+        "subgrade_title": SUBGRADE_TITLE,
+        "no_data": go.Layout(empty_figure_layout("No data for selected range")).to_plotly_json(),
+    }
 
-    @app.callback(
+
+def register_risk_subgrade_callbacks(app, data_loader, figure_cache=None, client_side=False):
+    """Register callbacks for risk subgrade analysis, drawn in the browser when client_side is set"""
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="toggleGradeDropdown"),
         Output("riskChart-gradeDropdown", "disabled"),
         Input("riskChart-groupToggle", "on"),
     )
-    def toggle_grade_dropdown(toggle_on):
-        return not toggle_on
 
-    @app.callback(
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="clearGradeDropdown"),
         Output("riskChart-gradeDropdown", "value"),
         Input("riskChart-groupToggle", "on"),
     )
-    def clear_grade_dropdown(toggle_on):
-        return None if not toggle_on else no_update
 
-    @app.callback(
-        Output("riskChart-graph", "figure"),
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="riskFilterState"),
         Output("riskChart-filterStore", "data"),
         Input("riskChart-dateRange", "start_date"),
         Input("riskChart-dateRange", "end_date"),
@@ -54,81 +69,109 @@ def register_risk_subgrade_callbacks(app, data_loader):
         Input("riskChart-gradeDropdown", "value"),
         State("riskChart-filterStore", "data"),
     )
+
+    if client_side:
+        app.clientside_callback(
+            ClientsideFunction(namespace="clientFiltering", function_name="riskChart"),
+            Output("riskChart-graph", "figure"),
+            Output("riskChart-summaryStore", "data"),
+            Input("riskChart-dateRange", "start_date"),
+            Input("riskChart-dateRange", "end_date"),
+            Input("riskChart-groupToggle", "on"),
+            Input("riskChart-gradeDropdown", "value"),
+            Input("client-cube", "data"),
+        )
+        return
+
+    @app.callback(
+        Output("riskChart-graph", "figure"),
+        Output("riskChart-summaryStore", "data"),
+        Input("riskChart-dateRange", "start_date"),
+        Input("riskChart-dateRange", "end_date"),
+        Input("riskChart-groupToggle", "on"),
+        Input("riskChart-gradeDropdown", "value"),
+        Input("app-state", "data"),
+    )
+    @instrumented
     def update_risk_chart(
-        start_date, end_date, is_subgrade_mode, selected_grade, filter_state
+        start_date, end_date, is_subgrade_mode, selected_grade, app_state
     ):
-        filter_state = filter_state or {}
-        filter_state.update(
-            {
-                "start_date": start_date,
-                "end_date": end_date,
-                "subgrade_mode": is_subgrade_mode,
-                "grade": selected_grade if is_subgrade_mode else None,
-            }
-        )
+        # Read before the query, so a reload in between keys the figure under
+        # the older version, which the figure cache will not store.
+        version = data_loader.version
+        try:
+            grade_totals = data_loader.get_risk_subgrade_data(start_date, end_date)
+        except Exception as error:
+            return create_error_figure(str(error)), {}
 
         fig = generate_risk_chart_figure(
-            start_date, end_date, is_subgrade_mode, selected_grade
+            grade_totals, start_date, end_date, is_subgrade_mode, selected_grade, version
         )
 
-        return fig, filter_state
+        return fig, build_summary(grade_totals)
 
-    def generate_risk_chart_figure(start_date, end_date, subgrade_mode, grade):
+    def build_summary(grade_totals):
+        if grade_totals.empty:
+            return {}
+
+        return (
+            grade_totals.set_index("grade")["loan_amount"]
+            .sort_index()
+            .to_dict()
+        )
+
+    def generate_risk_chart_figure(
+        grade_totals, start_date, end_date, subgrade_mode, grade, version
+    ):
+        grade = grade if subgrade_mode else None
         try:
-            df = data_loader.get_filtered_data(start_date, end_date)
-
-            if df.empty:
-                return create_empty_figure("No data for selected range")
-
-            df["grade"] = df["sub_grade"].str[0]
-
-            if subgrade_mode and grade:
-                df = df[df["grade"] == grade]
-                group_col = "sub_grade"
-                title = f"Loan Amount by Subgrade ({grade})"
-            else:
-                group_col = "grade"
-                title = "Loan Amount by Grade"
-
-            grouped = df.groupby(group_col)["loan_amount"].sum().reset_index()
-
-            fig = go.Figure(
-                go.Bar(
-                    x=grouped[group_col],
-                    y=grouped["loan_amount"],
-                    marker_color="#388E3C",
-                    text=[f"{v:,.0f}" for v in grouped["loan_amount"]],
-                    textposition="outside",
-                )
+            return cached_figure(
+                figure_cache,
+                "riskChart-graph",
+                {"start_date": start_date, "end_date": end_date, "grade": grade},
+                version,
+                lambda: build_risk_chart_figure(
+                    grade_totals, start_date, end_date, grade
+                ),
             )
+        except Exception as error:
+            return create_error_figure(str(error))
 
-            fig.update_layout(
-                title=dict(text=title, font=dict(color="white")),
-                plot_bgcolor="#222",
-                paper_bgcolor="#222",
-                xaxis=dict(tickfont=dict(color="#aaa")),
-                yaxis=dict(tickfont=dict(color="white")),
-                height=400,
+    def build_risk_chart_figure(grade_totals, start_date, end_date, grade):
+        if grade:
+            group_col = "sub_grade"
+            title = SUBGRADE_TITLE.format(grade=grade)
+            grouped = data_loader.get_risk_subgrade_data(
+                start_date, end_date, grade
+            )
+        else:
+            group_col = "grade"
+            title = GRADE_TITLE
+            grouped = grade_totals
+
+        if grouped.empty:
+            return create_empty_figure("No data for selected range")
+
+        fig = go.Figure(
+            go.Bar(
+                x=grouped[group_col],
+                y=grouped["loan_amount"],
+                **RISK_BAR_STYLE,
             )
+        )
 
-            return fig
+        fig.update_layout(**risk_chart_layout(title))
 
-        except Exception as error:
-            return create_error_figure(str(error))
+        return fig
 
     def create_empty_figure(message):
+        record_empty()
         fig = go.Figure()
-        fig.update_layout(
-            title=dict(text=message, font=dict(color="white")),
-            xaxis=dict(visible=False),
-            yaxis=dict(visible=False),
-            plot_bgcolor="#222",
-            paper_bgcolor="#222",
-            height=400,
-        )
+        fig.update_layout(**empty_figure_layout(message))
         return fig
 
     def create_error_figure(error_message):
+        record_error()
         fig = go.Figure()
         fig.update_layout(
             title=dict(text="Error", font=dict(color="white")),
@@ -151,3 +194,13 @@ def register_risk_subgrade_callbacks(app, data_loader):
         )
         return fig
 
+    def warm_default_figures():
+        version = data_loader.version
+        start_date, end_date = data_loader.get_date_range()
+        grade_totals = data_loader.get_risk_subgrade_data(start_date, end_date)
+        generate_risk_chart_figure(grade_totals, start_date, end_date, False, None, version)
+        for grade in data_loader.get_unique_grades():
+            generate_risk_chart_figure(grade_totals, start_date, end_date, True, grade, version)
+
+    if figure_cache is not None:
+        figure_cache.add_warmer(warm_default_figures)
@@ -2,10 +2,11 @@ import dash
 from dash import Dash
 import dash_bootstrap_components as dbc
 import os
-import plotly.graph_objects as go
-import pandas as pd
-import numpy as np
-from data import DataLoader
+from cache import FigureCache
+from serialization import use_fast_json
+from metrics import register_metrics_route
+from profiling import configure_profiling
+from startup import BackgroundLoader, register_ready_route
 from layout import dashboard
 from layout.third_layout import build_risk_subgrade_layout
 from Callbacks.first_callbacks import register_loan_chart_callbacks
@@ -13,6 +14,12 @@ from Callbacks.second_callbacks import register_second_chart_callbacks
 from Callbacks.third_callbacks import register_risk_subgrade_callbacks
 from Callbacks.fourth_callbacks import register_sunburst_chart_callbacks
 from Callbacks.fifth_callbacks import register_bar_chart_callbacks
+from Callbacks.reload_callbacks import register_reload_callbacks
+from Callbacks.client_cube_callbacks import register_client_cube_callbacks
+from Callbacks.startup_callbacks import register_startup_callbacks
+
+# pandas, numpy and the data layer are imported on first use (see startup.BackgroundLoader),
+# so importing this module and starting the server take well under the data load time.
 
 
 def load_css_files():
@@ -76,35 +83,82 @@ app = Dash(
     suppress_callback_exceptions=True,
 )
 
+use_fast_json()
+
 app.title = "Loan Analytics Dashboard"
 server = app.server
+register_metrics_route(server)
+configure_profiling()
 
 css_files, index_string = load_css_files()
 app.index_string = index_string
 
-def initialize_app():
+def initialize_app(warm_cache=True, watch_data=True, browser_filtering=False, background_load=True):
+    """Register the dashboard; browser_filtering draws four charts clientside from the client cube
+
+    With background_load the data loads on a thread: until it is published
+    the page is a loading placeholder and /ready answers 503.
+    """
     DATA_PATH = "portfolio.xlsx"
     
     if os.path.exists(DATA_PATH):
-        data_loader = DataLoader(DATA_PATH)
+        data_loader = BackgroundLoader(DATA_PATH)
     else:
         data_loader = None
-    
-    app.layout = dashboard.create_dashboard_layout(data_loader)
+
+    register_ready_route(
+        server,
+        lambda: data_loader is None or data_loader.ready,
+        lambda: data_loader.status() if data_loader else {'ready': True, 'sample': True},
+    )
+
+    def serve_layout():
+        if data_loader and not data_loader.ready:
+            return dashboard.create_loading_layout(data_loader.status())
+        return dashboard.create_dashboard_layout(
+            data_loader.loader if data_loader else None, client_cube=bool(data_loader) and browser_filtering
+        )
+
+    # A function, so each page load picks up the date ranges and grades of the current data.
+    app.layout = serve_layout
     
     if data_loader:
-        register_loan_chart_callbacks(app, data_loader)
-        register_second_chart_callbacks(app, data_loader)
-        register_risk_subgrade_callbacks(app, data_loader)
+        figure_cache = FigureCache()
+        register_loan_chart_callbacks(app, data_loader, figure_cache, client_side=browser_filtering)
+        register_second_chart_callbacks(app, data_loader, figure_cache)
+        register_risk_subgrade_callbacks(app, data_loader, figure_cache, client_side=browser_filtering)
+
+        register_sunburst_chart_callbacks(app, data_loader, figure_cache, client_side=browser_filtering)
+        register_bar_chart_callbacks(app, data_loader, figure_cache, client_side=browser_filtering)
+        register_reload_callbacks(app, data_loader)
+        if browser_filtering:
+            register_client_cube_callbacks(app, data_loader)
+        register_startup_callbacks(app)
 
-        register_sunburst_chart_callbacks(app, data_loader)
-        register_bar_chart_callbacks(app, data_loader)
+        def on_ready(loader):
+            # Appended loans keep the figures whose date range they miss.
+            loader.append_listeners.append(figure_cache.carry_forward)
+            if warm_cache:
+                figure_cache.warm()
+            if watch_data:
+                loader.start_watcher(on_reload=figure_cache.warm if warm_cache else None)
+
+        if background_load:
+            data_loader.start(on_ready)
+        else:
+            data_loader.load(on_ready)
+            if data_loader.error is not None:
+                raise data_loader.error
     else:
         register_sample_callbacks(app)
     
     return app
 
 def register_sample_callbacks(app):
+    import numpy as np
+    import pandas as pd
+    import plotly.graph_objects as go
+
     @app.callback(
         dash.Output('loan-chart', 'figure'),
         dash.Output('loan-filter-state', 'data'),
@@ -293,5 +347,5 @@ def register_sample_callbacks(app):
 
 if __name__ == '__main__':
     setup_assets_directory()
-    app = initialize_app()
+    app = initialize_app(browser_filtering=os.environ.get('DASHBOARD_BROWSER_FILTERING') == '1')
     app.run()
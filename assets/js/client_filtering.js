@@ -0,0 +1,283 @@
+// Browser-side filtering: the loan, risk, sunburst and bar charts are drawn
+// from the monthly projections in the client-cube store (client_cube.py),
+// with trace styles and layouts taken from the templates the server sends
+// alongside it. Date ranges select whole months: a month is included when
+// any day of it falls inside the picked range.
+(function () {
+    var ARRAY_TYPES = {
+        f8: Float64Array,
+        f4: Float32Array,
+        u1: Uint8Array,
+        u2: Uint16Array,
+        u4: Uint32Array,
+    };
+    var decoded = new WeakMap();
+
+    function decodeArray(spec) {
+        var binary = atob(spec.bdata);
+        var bytes = new Uint8Array(binary.length);
+        for (var i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        return new ARRAY_TYPES[spec.dtype](bytes.buffer);
+    }
+
+    // Decoded typed arrays for one projection, memoized per store value.
+    function projection(cube, name) {
+        var spec = cube.projections[name];
+        if (!spec) {
+            return null;
+        }
+        var cached = decoded.get(spec);
+        if (cached) {
+            return cached;
+        }
+        var result = { length: spec.length, month: decodeArray(spec.month), labels: spec.labels, codes: {}, measures: {} };
+        Object.keys(spec.codes).forEach(function (name) {
+            result.codes[name] = decodeArray(spec.codes[name]);
+        });
+        Object.keys(spec.measures).forEach(function (name) {
+            result.measures[name] = decodeArray(spec.measures[name]);
+        });
+        decoded.set(spec, result);
+        return result;
+    }
+
+    // Per-month flags for the months touched by [startDate, endDate], or all months without both.
+    function monthMask(cube, startDate, endDate) {
+        var first = startDate && endDate ? String(startDate).slice(0, 7) : null;
+        var last = startDate && endDate ? String(endDate).slice(0, 7) : null;
+        return cube.months.map(function (month) {
+            var key = month.slice(0, 7);
+            return first === null || (key >= first && key <= last);
+        });
+    }
+
+    // Sums of the given measures per key, in first-seen order; rows where keyOf returns null are skipped.
+    function sumBy(data, mask, keyOf, measures) {
+        var groups = new Map();
+        for (var row = 0; row < data.length; row++) {
+            if (!mask[data.month[row]]) {
+                continue;
+            }
+            var key = keyOf(row);
+            if (key === null) {
+                continue;
+            }
+            var sums = groups.get(key);
+            if (!sums) {
+                sums = {};
+                measures.forEach(function (measure) { sums[measure] = 0; });
+                groups.set(key, sums);
+            }
+            measures.forEach(function (measure) { sums[measure] += data.measures[measure][row]; });
+        }
+        return groups;
+    }
+
+    function compareKeys(a, b) {
+        return a < b ? -1 : a > b ? 1 : 0;
+    }
+
+    function clone(value) {
+        return JSON.parse(JSON.stringify(value));
+    }
+
+    function figure(cube, data, layout) {
+        layout = clone(layout);
+        layout.template = cube.templates.plotly;
+        return { data: data, layout: layout };
+    }
+
+    function noUpdate() {
+        return window.dash_clientside.no_update;
+    }
+
+    function loanChart(selectedGrades, startDate, endDate, cube) {
+        if (!cube || !cube.templates) {
+            return noUpdate();
+        }
+        var template = cube.templates.loanChart;
+        var data = projection(cube, "grades");
+        if (!data) {
+            return figure(cube, [], template.no_data);
+        }
+        var labels = data.labels.grade;
+        var grades = selectedGrades && selectedGrades.length ? selectedGrades : labels.filter(function (grade) {
+            return template.default_grades.indexOf(grade) !== -1;
+        });
+        if (!grades.length) {
+            return figure(cube, [], template.no_grades);
+        }
+
+        var codes = data.codes.grade;
+        var cells = sumBy(data, monthMask(cube, startDate, endDate), function (row) {
+            var grade = labels[codes[row]];
+            return grades.indexOf(grade) === -1 ? null : data.month[row] + "|" + grade;
+        }, ["loan_amount"]);
+        if (!cells.size) {
+            return figure(cube, [], template.no_data);
+        }
+
+        var months = [];
+        var present = {};
+        cells.forEach(function (sums, key) {
+            var parts = key.split("|");
+            var month = Number(parts[0]);
+            if (months.indexOf(month) === -1) {
+                months.push(month);
+            }
+            present[parts[1]] = true;
+        });
+        months.sort(function (a, b) { return a - b; });
+
+        var traces = grades.filter(function (grade) { return present[grade]; }).map(function (grade) {
+            var trace = clone(template.traces[grade]);
+            trace.x = months.map(function (month) { return cube.months[month]; });
+            trace.y = months.map(function (month) {
+                var sums = cells.get(month + "|" + grade);
+                return sums ? sums.loan_amount : 0;
+            });
+            return trace;
+        });
+        return figure(cube, traces, template.layout);
+    }
+
+    function riskChart(startDate, endDate, subgradeMode, selectedGrade, cube) {
+        if (!cube || !cube.templates) {
+            return [noUpdate(), noUpdate()];
+        }
+        var template = cube.templates.riskChart;
+        var data = projection(cube, "grades");
+        if (!data) {
+            return [figure(cube, [], template.no_data), {}];
+        }
+        var mask = monthMask(cube, startDate, endDate);
+        var gradeLabels = data.labels.grade;
+        var subgradeLabels = data.labels.sub_grade;
+        var gradeCodes = data.codes.grade;
+        var subgradeCodes = data.codes.sub_grade;
+
+        var gradeTotals = sumBy(data, mask, function (row) {
+            return gradeLabels[gradeCodes[row]];
+        }, ["loan_amount", "loan_count"]);
+        var summary = {};
+        Array.from(gradeTotals.keys()).sort(compareKeys).forEach(function (grade) {
+            summary[grade] = gradeTotals.get(grade).loan_amount;
+        });
+
+        var grade = subgradeMode ? selectedGrade : null;
+        var grouped = gradeTotals;
+        var layout = template.layout;
+        if (grade) {
+            grouped = sumBy(data, mask, function (row) {
+                return gradeLabels[gradeCodes[row]] === grade ? subgradeLabels[subgradeCodes[row]] : null;
+            }, ["loan_amount", "loan_count"]);
+            layout = clone(layout);
+            layout.title.text = template.subgrade_title.replace("{grade}", grade);
+        }
+        if (!grouped.size) {
+            return [figure(cube, [], template.no_data), summary];
+        }
+
+        var keys = Array.from(grouped.keys()).sort(compareKeys);
+        var trace = clone(template.trace);
+        trace.x = keys;
+        trace.y = keys.map(function (key) { return grouped.get(key).loan_amount; });
+        return [figure(cube, [trace], layout), summary];
+    }
+
+    function sunburstChart(startDate, endDate, cube) {
+        if (!cube || !cube.templates) {
+            return noUpdate();
+        }
+        var template = cube.templates.sunburstChart;
+        var data = projection(cube, "grades");
+        if (!data) {
+            return figure(cube, [], template.no_data);
+        }
+        var gradeLabels = data.labels.grade;
+        var subgradeLabels = data.labels.sub_grade;
+        var leaves = sumBy(data, monthMask(cube, startDate, endDate), function (row) {
+            return gradeLabels[data.codes.grade[row]] + "-" + subgradeLabels[data.codes.sub_grade[row]];
+        }, ["loan_amount", "loan_count"]);
+        if (!leaves.size) {
+            return figure(cube, [], template.no_data);
+        }
+
+        // Same node order as data.build_hierarchy: grades, then grade-subgrade pairs, each sorted.
+        var roots = new Map();
+        var children = [];
+        leaves.forEach(function (sums, id) {
+            var split = id.indexOf("-");
+            var grade = id.slice(0, split);
+            var root = roots.get(grade) || { loan_amount: 0, loan_count: 0 };
+            root.loan_amount += sums.loan_amount;
+            root.loan_count += sums.loan_count;
+            roots.set(grade, root);
+            children.push({ grade: grade, subgrade: id.slice(split + 1), sums: sums });
+        });
+        children.sort(function (a, b) {
+            return compareKeys(a.grade, b.grade) || compareKeys(a.subgrade, b.subgrade);
+        });
+
+        var trace = clone(template.trace);
+        ["ids", "labels", "parents", "values", "customdata"].forEach(function (name) { trace[name] = []; });
+        trace.marker.colors = [];
+        function addNode(id, label, parent, root, sums) {
+            trace.ids.push(id);
+            trace.labels.push(label);
+            trace.parents.push(parent);
+            trace.values.push(sums.loan_amount);
+            trace.customdata.push(sums.loan_count);
+            trace.marker.colors.push(template.colors[root] || template.default_color);
+        }
+        Array.from(roots.keys()).sort(compareKeys).forEach(function (grade) {
+            addNode(grade, grade, "", grade, roots.get(grade));
+        });
+        children.forEach(function (child) {
+            addNode(child.grade + "-" + child.subgrade, child.subgrade, child.grade, child.grade, child.sums);
+        });
+        return figure(cube, [trace], template.layout);
+    }
+
+    function barChart(variable, startDate, endDate, cube) {
+        if (!cube || !cube.templates) {
+            return noUpdate();
+        }
+        var template = cube.templates.barChart;
+        var data = projection(cube, variable);
+        var emptyLayout = template.no_data[variable];
+        if (!data) {
+            return emptyLayout ? figure(cube, [], emptyLayout) : noUpdate();
+        }
+        var labels = data.labels[variable];
+        var grouped = sumBy(data, monthMask(cube, startDate, endDate), function (row) {
+            return labels[data.codes[variable][row]];
+        }, ["loan_amount", "loan_count"]);
+        if (!grouped.size) {
+            return figure(cube, [], emptyLayout);
+        }
+
+        var rows = Array.from(grouped.keys()).map(function (label) {
+            return { label: label, total: grouped.get(label).loan_amount, count: grouped.get(label).loan_count };
+        });
+        rows.sort(function (a, b) { return b.total - a.total; });
+        rows = rows.slice(0, template.top_n);
+        rows.sort(function (a, b) { return a.total - b.total; });
+
+        var trace = clone(template.trace);
+        trace.y = rows.map(function (row) { return row.label; });
+        trace.x = rows.map(function (row) { return row.count; });
+        return figure(cube, [trace], template.layouts[variable]);
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        clientFiltering: {
+            loanChart: loanChart,
+            riskChart: riskChart,
+            sunburstChart: sunburstChart,
+            barChart: barChart,
+        },
+    });
+})();
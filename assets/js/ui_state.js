@@ -0,0 +1,63 @@
+// Clientside callbacks for state that never needs the data: the risk chart's
+// grade dropdown follows its toggle, each *-filterStore records the filters
+// its chart was last drawn with, and the loading page waits for /ready.
+// Registered from Callbacks/*.py.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    dashboard: {
+        toggleGradeDropdown: function (toggleOn) {
+            return !toggleOn;
+        },
+
+        clearGradeDropdown: function (toggleOn) {
+            return toggleOn ? window.dash_clientside.no_update : null;
+        },
+
+        loanFilterState: function (selectedGrades, startDate, endDate, gradeOptions, filterState) {
+            var grades = selectedGrades;
+            if (!grades || grades.length === 0) {
+                // The same default the server draws with: every grade A-E present in the data.
+                grades = (gradeOptions || [])
+                    .map(function (option) { return option.value; })
+                    .filter(function (grade) { return ["A", "B", "C", "D", "E"].indexOf(grade) !== -1; });
+            }
+            return Object.assign({}, filterState, {
+                grades: grades,
+                start_date: startDate,
+                end_date: endDate,
+            });
+        },
+
+        dateFilterState: function (startDate, endDate, filterState) {
+            return Object.assign({}, filterState, {
+                start_date: startDate,
+                end_date: endDate,
+            });
+        },
+
+        riskFilterState: function (startDate, endDate, subgradeMode, selectedGrade, filterState) {
+            return Object.assign({}, filterState, {
+                start_date: startDate,
+                end_date: endDate,
+                subgrade_mode: subgradeMode,
+                grade: subgradeMode ? selectedGrade : null,
+            });
+        },
+
+        barFilterState: function (selectedVariable, startDate, endDate, filterState) {
+            return Object.assign({}, filterState, {
+                variable: selectedVariable,
+                start_date: startDate,
+                end_date: endDate,
+            });
+        },
+
+        reloadWhenReady: function (nIntervals) {
+            fetch("/ready", { cache: "no-store" }).then(function (response) {
+                if (response.ok) {
+                    window.location.reload();
+                }
+            }).catch(function () {});
+            return window.dash_clientside.no_update;
+        },
+    },
+});
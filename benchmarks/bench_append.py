@@ -0,0 +1,103 @@
+"""Time appending a loan batch against rebuilding, and check both give the same data
+
+A synthetic portfolio is split into a base and a batch: either the newest
+loans, or with --backdated a random sample from the whole history. The base
+is loaded and queried, the batch appended, and the snapshot and every query
+are compared with a loader built from base and batch together. With
+--persist the batch goes through the delta directory and is folded into the
+column store, and a restarted loader must map the same data.
+
+    python benchmarks/bench_append.py --rows 400000 --batch 2000
+    python benchmarks/bench_append.py --rows 400000 --batch 2000 --backdated --persist
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_loader import SyntheticLoader, query_cases  # noqa: E402
+from benchmarks.synthetic import generate_portfolio  # noqa: E402
+from cache import LRUCache  # noqa: E402
+from data import compact_frame, prepare_tables  # noqa: E402
+
+
+def split_portfolio(frame, batch_rows, backdated, seed):
+    frame = frame.sort_values('issue_date', kind='stable', ignore_index=True)
+    if backdated:
+        in_batch = np.zeros(len(frame), dtype=bool)
+        in_batch[np.random.default_rng(seed).choice(len(frame), batch_rows, replace=False)] = True
+    else:
+        in_batch = np.arange(len(frame)) >= len(frame) - batch_rows
+    return frame[~in_batch].reset_index(drop=True), frame[in_batch].reset_index(drop=True)
+
+
+def loader_for(frame, work_dir, name):
+    marker = os.path.join(work_dir, f'{name}.txt')
+    with open(marker, 'w') as handle:
+        handle.write(f'{name} {len(frame)}\n')
+    data_loader = SyntheticLoader(frame, marker, os.path.join(work_dir, f'store-{name}'))
+    data_loader.query_cache = LRUCache()
+    return data_loader
+
+
+def compare(label, result, expected):
+    try:
+        pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-9)
+    except AssertionError as error:
+        print('FAIL', label, str(error).splitlines()[0])
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=400_000)
+    parser.add_argument('--batch', type=int, default=2_000)
+    parser.add_argument('--backdated', action='store_true', help='spread the batch over the whole history')
+    parser.add_argument('--persist', action='store_true', help='append through the delta directory and column store')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    base, batch = split_portfolio(generate_portfolio(args.rows, args.seed), args.batch, args.backdated, args.seed)
+    with tempfile.TemporaryDirectory() as work_dir:
+        appended = loader_for(base, work_dir, 'base')
+        for _, _, query in query_cases(appended):
+            query()
+        cached = appended.query_cache.stats()['entries']
+
+        started = time.perf_counter()
+        appended.append(batch, persist=args.persist)
+        append_seconds = time.perf_counter() - started
+        carried = appended.query_cache.stats()['entries']
+
+        full = pd.concat([base, batch], ignore_index=True)
+        started = time.perf_counter()
+        prepare_tables(compact_frame(full)[0])
+        rebuild_seconds = time.perf_counter() - started
+        reference = loader_for(full, work_dir, 'full')
+
+        print(f'{len(batch):,} loans onto {len(base):,}: append {append_seconds * 1000:.1f} ms, '
+              f'rebuild {rebuild_seconds * 1000:.1f} ms, {carried} of {cached} cached queries carried forward')
+
+        failures = compare('loans', appended.snapshot.df, reference.snapshot.df)
+        failures += compare('cube', appended.snapshot.cube, reference.snapshot.cube)
+        expected = {(method, case): query for method, case, query in query_cases(reference)}
+        for method, case, query in query_cases(appended):
+            failures += compare(f'{method} {case}', query(), expected[method, case]())
+        if args.persist:
+            restarted = loader_for(base, work_dir, 'base')
+            failures += compare('restarted loans', restarted.snapshot.df, reference.snapshot.df)
+            failures += compare('restarted cube', restarted.snapshot.cube, reference.snapshot.cube)
+    print(f'{failures} mismatches')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
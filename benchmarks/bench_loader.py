@@ -0,0 +1,186 @@
+"""Time DataLoader queries and loads on synthetic portfolios, writing JSON results
+
+Every query runs against an uncached loader, over a fixed set of date
+ranges and grade filters, at each requested size. Results carry wall time
+(min / median / mean over --repeat runs) and the peak traced allocation of
+one extra run, and can be diffed with benchmarks/compare.py.
+
+    python benchmarks/bench_loader.py --rows 40000 400000 --output results.json
+    python benchmarks/bench_loader.py --rows 10000000 --repeat 3 --output large.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import generate_portfolio  # noqa: E402
+from cache import LRUCache  # noqa: E402
+from data import DataLoader, compact_frame  # noqa: E402
+
+DEFAULT_ROWS = [40_000, 400_000, 4_000_000]
+BAR_VARIABLES = ['purpose', 'address_state', 'emp_length', 'Good Or Bad Loan']
+
+
+class SyntheticLoader(DataLoader):
+    """DataLoader whose source is a generated frame instead of a workbook
+
+    A small marker file stands in for the workbook so the column store keys
+    and invalidates exactly as it does for a real source.
+    """
+
+    def __init__(self, frame, marker_path, store_dir):
+        self.frame = frame
+        super().__init__(marker_path, store_dir, query_cache=LRUCache(max_entries=0))
+
+    def read_source(self):
+        return compact_frame(self.frame)
+
+
+def date_ranges(data_loader):
+    first, last = data_loader.get_date_range()
+    first_month = first.to_period('M').to_timestamp()
+    return {
+        'all': (None, None),
+        'full': (first, last),
+        'quarter': (first + pd.Timedelta(days=40), first + pd.Timedelta(days=130)),
+        'month': (first_month + pd.DateOffset(months=5), first_month + pd.DateOffset(months=6) - pd.Timedelta(days=1)),
+        'week': (first + pd.Timedelta(days=200), first + pd.Timedelta(days=206)),
+    }
+
+
+def query_cases(data_loader):
+    """(method, case, callable) for every query method over the filter matrix"""
+    cases = []
+    for span, (start, end) in date_ranges(data_loader).items():
+        def add(method, case, query):
+            cases.append((method, f'{span}/{case}' if case else span, query))
+
+        add('get_filtered_data', '', lambda s=start, e=end: data_loader.get_filtered_data(s, e))
+        add('get_filtered_data', 'ABC', lambda s=start, e=end: data_loader.get_filtered_data(s, e, ['A', 'B', 'C']))
+        add('get_monthly_data', 'ABCDE', lambda s=start, e=end: data_loader.get_monthly_data(s, e, list('ABCDE')))
+        add('get_monthly_data', 'G', lambda s=start, e=end: data_loader.get_monthly_data(s, e, ['G']))
+        add('get_state_loan_data', '', lambda s=start, e=end: data_loader.get_state_loan_data(s, e))
+        add('get_risk_subgrade_data', '', lambda s=start, e=end: data_loader.get_risk_subgrade_data(s, e))
+        add('get_risk_subgrade_data', 'B', lambda s=start, e=end: data_loader.get_risk_subgrade_data(s, e, 'B'))
+        for variable in BAR_VARIABLES:
+            add('get_bar_chart_data', variable, lambda s=start, e=end, v=variable: data_loader.get_bar_chart_data(v, s, e))
+        add('get_sunburst_data', '', lambda s=start, e=end: data_loader.get_sunburst_data(s, e))
+    return cases
+
+
+def measure(run, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'min_s': min(times),
+        'median_s': statistics.median(times),
+        'mean_s': statistics.fmean(times),
+        'repeat': repeat,
+        'peak_bytes': peak,
+    }
+
+
+def bench_size(rows, seed, repeat, work_dir, log):
+    results = []
+
+    def record(method, case, stats):
+        results.append({'rows': rows, 'method': method, 'case': case, **stats})
+        log(f'{rows:>10,} {method:<24} {case:<22} {stats["median_s"] * 1000:10.2f} ms '
+            f'{stats["peak_bytes"] / 1e6:9.1f} MB')
+
+    started = time.perf_counter()
+    frame = generate_portfolio(rows, seed)
+    log(f'generated {rows:,} rows in {time.perf_counter() - started:.1f}s')
+
+    marker = os.path.join(work_dir, f'synthetic-{rows}-{seed}.txt')
+    with open(marker, 'w') as handle:
+        handle.write(f'{rows} {seed}\n')
+    store_dir = os.path.join(work_dir, f'store-{rows}-{seed}')
+
+    data_loader = SyntheticLoader(frame, marker, store_dir)
+    record('load_data', 'build', measure(
+        data_loader.load_data, max(1, repeat // 2), setup=lambda: shutil.rmtree(store_dir, ignore_errors=True)
+    ))
+    record('load_data', 'mapped', measure(data_loader.load_data, repeat))
+
+    for method, case, query in query_cases(data_loader):
+        record(method, case, measure(query, repeat))
+    return results
+
+
+def revision():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f'{commit}+dirty' if dirty else commit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default='benchmarks/results.json')
+    parser.add_argument('--work-dir', help='where synthetic stores are written, a temp dir by default')
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='dashboard-bench-')
+    os.makedirs(work_dir, exist_ok=True)
+    results = []
+    try:
+        for rows in args.rows:
+            results += bench_size(rows, args.seed, args.repeat, work_dir, log=print)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'revision': revision(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as handle:
+        json.dump(report, handle, indent=1)
+    print(f'wrote {len(results)} results to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Diff two bench_loader.py result files, flagging slower or hungrier cases
+
+    python benchmarks/compare.py before.json after.json --threshold 0.10
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path, encoding='utf-8') as handle:
+        report = json.load(handle)
+    results = {(r['rows'], r['method'], r['case']): r for r in report['results']}
+    return report['meta'], results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative change reported as a regression')
+    args = parser.parse_args()
+
+    before_meta, before = load(args.before)
+    after_meta, after = load(args.after)
+    print(f"{before_meta.get('revision')} -> {after_meta.get('revision')}")
+    print(f"{'rows':>10} {'method':<24} {'case':<22} {'before ms':>10} {'after ms':>10} {'time':>7} {'memory':>7}")
+
+    regressions = 0
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        time_ratio = new['median_s'] / old['median_s'] if old['median_s'] else float('inf')
+        memory_ratio = new['peak_bytes'] / old['peak_bytes'] if old['peak_bytes'] else 1.0
+        regressed = time_ratio > 1 + args.threshold or memory_ratio > 1 + args.threshold
+        regressions += regressed
+        rows, method, case = key
+        print(f"{rows:>10,} {method:<24} {case:<22} {old['median_s'] * 1000:10.2f} {new['median_s'] * 1000:10.2f} "
+              f"{time_ratio:6.2f}x {memory_ratio:6.2f}x{'  <-' if regressed else ''}")
+
+    for label, keys in (('only before', before.keys() - after.keys()), ('only after', after.keys() - before.keys())):
+        if keys:
+            print(f'{len(keys)} cases {label}')
+    print(f'{regressions} regressions above {args.threshold:.0%}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""Drive /_dash-update-component with concurrent simulated sessions and report latency
+
+Each session loads the page (firing every initial callback), then replays a
+random mix of real interactions: date-range drags on any of the five
+charts, grade multi-select changes, risk subgrade toggles and grade picks,
+and bar variable switches. Callbacks triggered by another callback's output
+are followed the way the Dash renderer follows them; clientside callbacks
+that feed server callbacks are replayed locally (see CLIENTSIDE), the rest
+never reach the server and are skipped.
+
+Runs in-process against app.server by default, or against a running server
+with --url.
+
+    python benchmarks/load_test.py --sessions 8 --duration 30
+    python benchmarks/load_test.py --sessions 8 --duration 30 --browser-filtering
+    python benchmarks/load_test.py --url http://127.0.0.1:8050 --sessions 32 --think-ms 500
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+UPDATE_PATH = '/_dash-update-component'
+INTERACTIONS = {
+    'date_drag': 0.4,
+    'grade_select': 0.2,
+    'risk_toggle': 0.15,
+    'risk_grade': 0.1,
+    'bar_variable': 0.15,
+}
+DATE_RANGES = ['loanChart-dateRange', 'secondChart-dateRange', 'riskChart-dateRange',
+               'sunburstChart-dateRange', 'barChart-dateRange']
+MAX_CHAIN_DEPTH = 4
+NO_UPDATE = object()
+# Python twins of the assets/js clientside functions whose outputs are inputs to server callbacks.
+CLIENTSIDE = {
+    'toggleGradeDropdown': lambda toggle_on: not toggle_on,
+    'clearGradeDropdown': lambda toggle_on: NO_UPDATE if toggle_on else None,
+}
+
+
+class InProcessClient:
+    def __init__(self, server):
+        self.client = server.test_client()
+
+    def get_json(self, path):
+        return self.client.get(path).get_json()
+
+    def post_json(self, path, payload):
+        response = self.client.post(path, json=payload)
+        return response.status_code, response.get_data()
+
+
+class HttpClient:
+    def __init__(self, url):
+        import requests
+
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+
+    def get_json(self, path):
+        return self.session.get(self.url + path).json()
+
+    def post_json(self, path, payload):
+        response = self.session.post(self.url + path, json=payload)
+        return response.status_code, response.content
+
+
+def layout_props(layout):
+    """{component id: props} for every component with an id in the served layout"""
+    found = {}
+    stack = [layout]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            props = node.get('props')
+            if isinstance(props, dict) and isinstance(props.get('id'), str):
+                found[props['id']] = props
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return found
+
+
+def parse_outputs(output):
+    if output.startswith('..'):
+        parts = output[2:-2].split('...')
+    else:
+        parts = [output]
+    return [dict(zip(('id', 'property'), part.rsplit('.', 1))) for part in parts]
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.interactions = 0
+
+    def record(self, label, seconds, ok, size):
+        with self.lock:
+            self.latencies[label].append(seconds)
+            self.bytes[label] += size
+            if not ok:
+                self.errors[label] += 1
+
+
+class Session:
+    """One simulated browser tab: its component state and the callbacks that state triggers"""
+
+    def __init__(self, client, dependencies, props, rng, stats):
+        self.client = client
+        self.dependencies = [d for d in dependencies if not d.get('clientside_function')]
+        self.clientside = [
+            d for d in dependencies
+            if (d.get('clientside_function') or {}).get('function_name') in CLIENTSIDE
+        ]
+        self.rng = rng
+        self.stats = stats
+        self.state = {}
+        for component_id, component_props in props.items():
+            for prop, value in component_props.items():
+                self.state[(component_id, prop)] = value
+        self.grades = [o['value'] for o in props.get('loanChart-gradeDropdown', {}).get('options', [])]
+        self.variables = [o['value'] for o in props.get('barChart-variableDropdown', {}).get('options', [])]
+        date_range = props.get('loanChart-dateRange', {})
+        self.days = pd.date_range(
+            date_range.get('min_date_allowed'), date_range.get('max_date_allowed'), freq='D'
+        ).strftime('%Y-%m-%d').tolist()
+
+    def page_load(self):
+        for dependency in self.clientside:
+            if not dependency.get('prevent_initial_call'):
+                self.run_clientside(dependency)
+        for dependency in self.dependencies:
+            if not dependency.get('prevent_initial_call'):
+                self.fire(dependency, None, 0)
+
+    def change(self, component_id, prop, value):
+        self.state[(component_id, prop)] = value
+        self.propagate([(component_id, prop)], 0)
+
+    def propagate(self, changed, depth):
+        """Fire each server callback once for a set of changes, after the clientside ones they wait on"""
+        if depth > MAX_CHAIN_DEPTH:
+            return
+        changed = list(changed)
+        for dependency in self.clientside:
+            if self.trigger(dependency, changed):
+                changed += self.run_clientside(dependency)
+        for dependency in self.dependencies:
+            trigger = self.trigger(dependency, changed)
+            if trigger:
+                self.fire(dependency, trigger, depth)
+
+    @staticmethod
+    def trigger(dependency, changed):
+        for component_id, prop in changed:
+            if any(i['id'] == component_id and i['property'] == prop for i in dependency['inputs']):
+                return f'{component_id}.{prop}'
+        return None
+
+    def run_clientside(self, dependency):
+        function = CLIENTSIDE[dependency['clientside_function']['function_name']]
+        value = function(*(self.state.get((i['id'], i['property'])) for i in dependency['inputs']))
+        output = parse_outputs(dependency['output'])[0]
+        key = (output['id'], output['property'])
+        if value is NO_UPDATE or self.state.get(key) == value:
+            return []
+        self.state[key] = value
+        return [key]
+
+    def fire(self, dependency, trigger, depth):
+        outputs = parse_outputs(dependency['output'])
+        payload = {
+            'output': dependency['output'],
+            'outputs': outputs if dependency['output'].startswith('..') else outputs[0],
+            'inputs': [dict(i, value=self.state.get((i['id'], i['property']))) for i in dependency['inputs']],
+            'state': [dict(s, value=self.state.get((s['id'], s['property']))) for s in dependency['state']],
+            'changedPropIds': [trigger] if trigger else [],
+        }
+        label = f"{outputs[0]['id']}.{outputs[0]['property']}"
+        started = time.perf_counter()
+        status, body = self.client.post_json(UPDATE_PATH, payload)
+        self.stats.record(label, time.perf_counter() - started, status in (200, 204), len(body))
+        if status != 200:
+            return
+
+        changed = []
+        for component_id, props in json.loads(body).get('response', {}).items():
+            for prop, value in props.items():
+                if prop == 'figure':
+                    continue
+                if self.state.get((component_id, prop)) != value:
+                    self.state[(component_id, prop)] = value
+                    changed.append((component_id, prop))
+        self.propagate(changed, depth + 1)
+
+    def interact(self):
+        kind = self.rng.choices(list(INTERACTIONS), weights=list(INTERACTIONS.values()))[0]
+        if kind == 'date_drag':
+            component_id = self.rng.choice(DATE_RANGES)
+            start, end = sorted(self.rng.sample(self.days, 2))
+            self.change(component_id, 'start_date', start)
+            self.change(component_id, 'end_date', end)
+        elif kind == 'grade_select':
+            count = self.rng.randint(1, len(self.grades))
+            self.change('loanChart-gradeDropdown', 'value', sorted(self.rng.sample(self.grades, count)))
+        elif kind == 'risk_toggle':
+            self.change('riskChart-groupToggle', 'on', not self.state.get(('riskChart-groupToggle', 'on')))
+        elif kind == 'risk_grade':
+            if not self.state.get(('riskChart-groupToggle', 'on')):
+                self.change('riskChart-groupToggle', 'on', True)
+            self.change('riskChart-gradeDropdown', 'value', self.rng.choice(self.grades))
+        else:
+            current = self.state.get(('barChart-variableDropdown', 'value'))
+            choices = [v for v in self.variables if v != current] or self.variables
+            self.change('barChart-variableDropdown', 'value', self.rng.choice(choices))
+        with self.stats.lock:
+            self.stats.interactions += 1
+
+
+def percentiles(values):
+    milliseconds = np.asarray(values) * 1000
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99, 'max_ms': milliseconds.max(), 'mean_ms': milliseconds.mean()}
+
+
+def summarize(stats, elapsed, sessions):
+    rows = []
+    everything = []
+    for label in sorted(stats.latencies):
+        values = stats.latencies[label]
+        everything += values
+        rows.append({
+            'callback': label,
+            'requests': len(values),
+            'errors': stats.errors[label],
+            'per_second': len(values) / elapsed,
+            'mean_bytes': stats.bytes[label] / len(values),
+            **percentiles(values),
+        })
+    total = {
+        'sessions': sessions,
+        'seconds': elapsed,
+        'interactions': stats.interactions,
+        'requests': len(everything),
+        'errors': sum(stats.errors.values()),
+        'per_second': len(everything) / elapsed,
+        **(percentiles(everything) if everything else {}),
+    }
+    return {'total': total, 'callbacks': rows}
+
+
+def print_summary(summary):
+    print(f"{'callback':<36} {'reqs':>7} {'err':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'KB':>7}")
+    for row in summary['callbacks']:
+        print(f"{row['callback']:<36} {row['requests']:>7} {row['errors']:>5} {row['per_second']:>8.1f} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f} "
+              f"{row['mean_bytes'] / 1024:>7.1f}")
+    total = summary['total']
+    print(f"{total['sessions']} sessions, {total['interactions']} interactions, {total['requests']} requests "
+          f"in {total['seconds']:.1f}s: {total['per_second']:.1f} req/s, {total['errors']} errors, "
+          f"p50 {total.get('p50_ms', 0):.1f} ms, p95 {total.get('p95_ms', 0):.1f} ms, p99 {total.get('p99_ms', 0):.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=8, help='concurrent simulated users')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds of interactions after page load')
+    parser.add_argument('--think-ms', type=float, default=0.0, help='mean pause between interactions')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--url', help='target a running server instead of app.server in-process')
+    parser.add_argument('--cold', action='store_true', help='skip figure cache warm-up (in-process only)')
+    parser.add_argument('--browser-filtering', action='store_true',
+                        help='draw the cube-backed charts clientside (in-process only)')
+    parser.add_argument('--output', help='write the summary as JSON')
+    args = parser.parse_args()
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)  # noqa: E731
+    else:
+        os.chdir(ROOT)
+        import app as dashboard_app
+
+        server = dashboard_app.initialize_app(
+            warm_cache=not args.cold, watch_data=False, browser_filtering=args.browser_filtering,
+            background_load=False,
+        ).server
+        make_client = lambda: InProcessClient(server)  # noqa: E731
+
+    probe = make_client()
+    dependencies = probe.get_json('/_dash-dependencies')
+    props = layout_props(probe.get_json('/_dash-layout'))
+    stats = Stats()
+    deadline = time.perf_counter() + args.duration
+
+    def run_session(seed):
+        rng = random.Random(seed)
+        session = Session(make_client(), dependencies, props, rng, stats)
+        session.page_load()
+        while time.perf_counter() < deadline:
+            session.interact()
+            if args.think_ms:
+                time.sleep(rng.expovariate(1000.0 / args.think_ms))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=run_session, args=(args.seed + n,)) for n in range(args.sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    summary = summarize(stats, time.perf_counter() - started, args.sessions)
+    print_summary(summary)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(summary, handle, indent=1)
+    return 1 if summary['total']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Hammer every DataLoader query from many threads and check each result
+
+Reference results are computed single-threaded first. Worker threads then
+replay random queries while a reloader thread keeps publishing new
+snapshots of the same workbook; every result must match its reference.
+
+    python benchmarks/stress_snapshots.py --threads 16 --seconds 20
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data import DataLoader  # noqa: E402
+
+
+def query_plan(data_loader):
+    """(label, callable) pairs covering every query method over several date ranges"""
+    start, end = data_loader.get_date_range()
+    ranges = [(None, None), (start, end)]
+    for offset in (3, 17, 40):
+        ranges.append((start + pd.Timedelta(days=offset), end - pd.Timedelta(days=offset // 2)))
+    grades = data_loader.get_unique_grades()
+
+    plan = []
+    for start_date, end_date in ranges:
+        span = (str(start_date), str(end_date))
+        plan.append((('monthly', span), lambda s=start_date, e=end_date: data_loader.get_monthly_data(s, e, grades[:3])))
+        plan.append((('state', span), lambda s=start_date, e=end_date: data_loader.get_state_loan_data(s, e)))
+        plan.append((('risk', span), lambda s=start_date, e=end_date: data_loader.get_risk_subgrade_data(s, e)))
+        for grade in grades[:2]:
+            plan.append((('risk', span, grade), lambda s=start_date, e=end_date, g=grade: data_loader.get_risk_subgrade_data(s, e, g)))
+        for variable in ('purpose', 'emp_length', 'Good Or Bad Loan'):
+            plan.append((('bar', span, variable), lambda s=start_date, e=end_date, v=variable: data_loader.get_bar_chart_data(v, s, e)))
+        plan.append((('sunburst', span), lambda s=start_date, e=end_date: data_loader.get_sunburst_data(s, e)))
+        plan.append((('rows', span), lambda s=start_date, e=end_date: data_loader.get_filtered_data(s, e, grades[:2])))
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--file', default='portfolio.xlsx')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--reload-every', type=float, default=0.5, help='seconds between reloads, 0 to disable')
+    args = parser.parse_args()
+
+    data_loader = DataLoader(args.file)
+    plan = query_plan(data_loader)
+    reference = {label: query().copy() for label, query in plan}
+    deadline = time.perf_counter() + args.seconds
+    stop = threading.Event()
+
+    def reloader():
+        reloads = 0
+        while not stop.wait(args.reload_every):
+            data_loader.load_data()
+            reloads += 1
+        return reloads
+
+    def worker(seed):
+        rng = random.Random(seed)
+        calls, failures = 0, []
+        while time.perf_counter() < deadline:
+            label, query = rng.choice(plan)
+            try:
+                result = query()
+            except Exception as error:
+                failures.append((label, repr(error)))
+                continue
+            if not result.equals(reference[label]):
+                failures.append((label, 'result differs from reference'))
+            # Callers own their results: scribbling on one must not leak into the next.
+            result.drop(index=result.index, inplace=True)
+            calls += 1
+        return calls, failures
+
+    with ThreadPoolExecutor(max_workers=args.threads + 1) as pool:
+        reloads = pool.submit(reloader) if args.reload_every > 0 else None
+        results = [f.result() for f in [pool.submit(worker, seed) for seed in range(args.threads)]]
+        stop.set()
+        reload_count = reloads.result() if reloads else 0
+
+    calls = sum(count for count, _ in results)
+    failures = [failure for _, found in results for failure in found]
+    print(f'{calls:,} queries on {args.threads} threads in {args.seconds:.0f}s '
+          f'({calls / args.seconds:,.0f}/s), {reload_count} reloads, final version {data_loader.version}')
+    for label, message in failures[:20]:
+        print('FAIL', label, message)
+    print(f'{len(failures)} failures')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
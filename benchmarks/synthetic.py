@@ -0,0 +1,86 @@
+"""Deterministic synthetic loan portfolios shaped like portfolio.xlsx
+
+Marginals (grade mix, states, purposes, employment length, bad-loan rate per
+grade, amount and income spread, interest rate per grade) follow the real
+workbook; the same rows and seed always give the same frame.
+"""
+import numpy as np
+import pandas as pd
+
+GRADE_WEIGHTS = {'A': 0.251, 'B': 0.303, 'C': 0.205, 'D': 0.134, 'E': 0.072, 'F': 0.027, 'G': 0.008}
+BAD_RATE = {'A': 0.057, 'B': 0.115, 'C': 0.16, 'D': 0.207, 'E': 0.248, 'F': 0.303, 'G': 0.313}
+INT_RATE = {'A': (0.0735, 0.0103), 'B': (0.1103, 0.009), 'C': (0.1355, 0.0094), 'D': (0.1571, 0.0118),
+            'E': (0.1771, 0.0141), 'F': (0.1974, 0.0148), 'G': (0.214, 0.0134)}
+HOME_OWNERSHIP_WEIGHTS = {'RENT': 0.478, 'MORTGAGE': 0.446, 'OWN': 0.074, 'OTHER': 0.002}
+EMP_LENGTH_WEIGHTS = {
+    '10+ years': 0.23, '< 1 year': 0.119, '2 years': 0.114, '3 years': 0.106, '4 years': 0.089,
+    '5 years': 0.085, '1 year': 0.084, '6 years': 0.058, '7 years': 0.046, '8 years': 0.038, '9 years': 0.033,
+}
+PURPOSE_WEIGHTS = {
+    'Debt consolidation': 0.472, 'credit card': 0.13, 'other': 0.099, 'home improvement': 0.075,
+    'major purchase': 0.055, 'small business': 0.046, 'car': 0.039, 'wedding': 0.024, 'medical': 0.017,
+    'moving': 0.014, 'house': 0.009, 'vacation': 0.009, 'educational': 0.008, 'renewable_energy': 0.002,
+}
+STATE_WEIGHTS = {
+    'CA': 0.179, 'NY': 0.096, 'FL': 0.072, 'TX': 0.069, 'NJ': 0.047, 'IL': 0.039, 'PA': 0.038, 'VA': 0.036,
+    'GA': 0.035, 'MA': 0.034, 'OH': 0.031, 'MD': 0.027, 'AZ': 0.022, 'WA': 0.021, 'CO': 0.02, 'NC': 0.02,
+    'CT': 0.019, 'MI': 0.018, 'MO': 0.017, 'MN': 0.015, 'NV': 0.012, 'SC': 0.012, 'WI': 0.012, 'OR': 0.011,
+    'AL': 0.011, 'LA': 0.011, 'KY': 0.008, 'OK': 0.008, 'KS': 0.007, 'UT': 0.007, 'AR': 0.006, 'DC': 0.006,
+    'RI': 0.005, 'NM': 0.005, 'HI': 0.004, 'WV': 0.004, 'NH': 0.004, 'DE': 0.003, 'WY': 0.002, 'MT': 0.002,
+    'AK': 0.002, 'SD': 0.002, 'VT': 0.001,
+}
+LOAN_AMOUNT_LOG = (9.1, 0.73)
+ANNUAL_INCOME_LOG = (10.99, 0.55)
+
+
+def _choice(rng, weights, rows):
+    """Categorical column drawn from a {label: weight} mapping"""
+    labels = list(weights)
+    p = np.fromiter(weights.values(), dtype=np.float64)
+    codes = rng.choice(len(labels), size=rows, p=p / p.sum()).astype(np.int8)
+    return pd.Categorical.from_codes(codes, categories=labels)
+
+
+def generate_portfolio(rows, seed=0, start='2021-01-01', days=365):
+    """A frame with the workbook's used columns and the dtypes the loader keeps them in
+
+    Issue dates grow linearly in volume across `days` days from `start`.
+    """
+    rng = np.random.default_rng(seed)
+
+    grade = _choice(rng, GRADE_WEIGHTS, rows)
+    grade_codes = grade.codes.astype(np.int64)
+    grades = np.asarray(grade.categories)
+    sub_grade_number = rng.integers(0, 5, size=rows)
+    sub_grades = np.array([f'{g}{n}' for g in grades for n in range(1, 6)])
+    sub_grade = pd.Categorical.from_codes(grade_codes * 5 + sub_grade_number, categories=sub_grades)
+
+    day_weights = np.linspace(1.0, 2.0, days)
+    offsets = rng.choice(days, size=rows, p=day_weights / day_weights.sum())
+    issue_date = np.datetime64(start, 'ns') + offsets.astype('timedelta64[D]')
+
+    loan_amount = np.exp(rng.normal(*LOAN_AMOUNT_LOG, size=rows))
+    loan_amount = (np.clip(np.round(loan_amount / 25) * 25, 500, 35000)).astype(np.int32)
+    annual_income = np.round(np.exp(rng.normal(*ANNUAL_INCOME_LOG, size=rows)), -2).astype(np.float32)
+
+    rate_mean = np.array([INT_RATE[g][0] for g in grades])[grade_codes]
+    rate_std = np.array([INT_RATE[g][1] for g in grades])[grade_codes]
+    int_rate = np.round(rng.normal(rate_mean, rate_std), 4).astype(np.float32)
+
+    bad = rng.random(rows) < np.array([BAD_RATE[g] for g in grades])[grade_codes]
+    quality = pd.Categorical.from_codes(bad.astype(np.int8), categories=['Good Loan', 'Bad Loan'])
+
+    return pd.DataFrame({
+        'id': np.arange(1, rows + 1, dtype=np.int32),
+        'address_state': _choice(rng, STATE_WEIGHTS, rows),
+        'emp_length': _choice(rng, EMP_LENGTH_WEIGHTS, rows),
+        'grade': grade,
+        'home_ownership': _choice(rng, HOME_OWNERSHIP_WEIGHTS, rows),
+        'issue_date': issue_date,
+        'Good Or Bad Loan': quality,
+        'purpose': _choice(rng, PURPOSE_WEIGHTS, rows),
+        'sub_grade': sub_grade,
+        'annual_income': annual_income,
+        'int_rate': int_rate,
+        'loan_amount': loan_amount,
+    })
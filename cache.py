@@ -0,0 +1,210 @@
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import record_cache, stage
+from serialization import figure_to_json, loads
+
+logger = logging.getLogger(__name__)
+
+UNORDERED_ARGUMENTS = {'grades'}
+
+
+def canonical_date(value):
+    """Day string for midnight timestamps, full ISO string otherwise"""
+    if value is None or value == '':
+        return None
+    import pandas as pd
+
+    timestamp = pd.Timestamp(value)
+    if timestamp == timestamp.normalize():
+        return timestamp.date().isoformat()
+    return timestamp.isoformat()
+
+
+def canonical_value(name, value):
+    if name.endswith('_date'):
+        return canonical_date(value)
+    if name in UNORDERED_ARGUMENTS or isinstance(value, (set, frozenset)):
+        return tuple(sorted(set(value))) if value else None
+    if isinstance(value, (list, tuple)):
+        return tuple(value)
+    if isinstance(value, dict):
+        return tuple(sorted(value.items()))
+    return value
+
+
+def outside_dates(first, last):
+    """Key filter passing entries whose start_date..end_date range lies wholly before first or after last
+
+    Keys are (name, version, (argument, canonical value)...). Entries without
+    both dates cover all the data and never pass.
+    """
+    import pandas as pd
+
+    first, last = pd.Timestamp(first), pd.Timestamp(last)
+
+    def unaffected(key):
+        arguments = dict(key[2:])
+        start, end = arguments.get('start_date'), arguments.get('end_date')
+        if not (start and end):
+            return False
+        return pd.Timestamp(end) < first or pd.Timestamp(start) > last
+
+    return unaffected
+
+
+def estimate_size(value):
+    import pandas as pd
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True, index=True))
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Thread-safe LRU mapping bounded by entry count and by estimated bytes"""
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, sizeof=estimate_size):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return (found, value) and mark the entry as recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def carry_forward(self, old_version, new_version, keep):
+        """Re-key the old_version entries keep(key) accepts to new_version and drop the rest
+
+        For (name, version, ...) keys; entries already built for new_version stay.
+        """
+        with self._lock:
+            entries = OrderedDict()
+            for key, entry in self._entries.items():
+                if key[1] == old_version and keep(key):
+                    key = key[:1] + (new_version,) + key[2:]
+                elif key[1] != new_version:
+                    continue
+                entries.setdefault(key, entry)
+            self._entries = entries
+            self._bytes = sum(size for _, size in entries.values())
+            return len(entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+
+class FigureCache(LRUCache):
+    """Serialized Plotly figures keyed by chart id, canonical inputs and data version"""
+
+    def __init__(self, max_entries=512, max_bytes=32 * 1024 * 1024):
+        super().__init__(max_entries, max_bytes, sizeof=len)
+        self.version = None
+        self._warmers = []
+
+    def add_warmer(self, warmer):
+        """Register a callable that renders a chart's default-state figures"""
+        self._warmers.append(warmer)
+
+    def warm(self):
+        started = time.perf_counter()
+        for warmer in self._warmers:
+            try:
+                warmer()
+            except Exception:
+                logger.exception('Figure cache warm-up failed in %s', warmer.__qualname__)
+        logger.info(
+            'Warmed %d figures in %.2fs', self.stats()['entries'], time.perf_counter() - started
+        )
+
+    def carry_forward(self, old_version, new_version, keep):
+        carried = super().carry_forward(old_version, new_version, keep)
+        with self._lock:
+            # The loader knows which version is current, even when it sorts before
+            # the old one, as when a reload drops batches appended in memory.
+            self.version = new_version
+        return carried
+
+    def key(self, chart_id, inputs, version):
+        return (chart_id, version) + tuple(
+            (name, canonical_value(name, value)) for name, value in sorted(inputs.items())
+        )
+
+    def get_or_build(self, chart_id, inputs, version, build):
+        """Return the cached figure as a plain dict, building and storing it on a miss
+
+        The loader sets the current version through carry_forward. A request
+        that read any other version, older or dropped by a reload, is stale:
+        its figure is built and returned but never stored, so it cannot evict
+        the current version's figures.
+        """
+        with self._lock:
+            if self.version is None:
+                self.version = version
+            stale = version != self.version
+        key = self.key(chart_id, inputs, version)
+        found, payload = (False, None) if stale else self.get(key)
+        record_cache('figure', found)
+        if not found:
+            with stage('figure'):
+                figure = build()
+            with stage('serialize'):
+                payload = figure_to_json(figure)
+            if not stale:
+                self.put(key, payload)
+        with stage('serialize'):
+            return loads(payload)
+
+
+def cached_figure(figure_cache, chart_id, inputs, version, build):
+    if figure_cache is None:
+        with stage('figure'):
+            return build()
+    return figure_cache.get_or_build(chart_id, inputs, version, build)
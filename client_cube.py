@@ -0,0 +1,65 @@
+import base64
+
+import numpy as np
+import pandas as pd
+
+# Projections of the monthly cube that the browser-filtered charts re-aggregate:
+# name -> (dimensions besides month, measures). Each is a few hundred cells. Only
+# sums are shipped: averages would also need the *_count denominators.
+CLIENT_PROJECTIONS = {
+    'grades': (['grade', 'sub_grade'], ['loan_amount', 'loan_count']),
+    'purpose': (['purpose'], ['loan_amount', 'loan_count']),
+    'home_ownership': (['home_ownership'], ['loan_amount', 'loan_count']),
+    'emp_length': (['emp_length'], ['loan_amount', 'loan_count']),
+}
+
+
+def typed_array(values):
+    """A numpy array as plotly's {dtype, bdata} spec: little-endian bytes, base64 encoded"""
+    values = np.ascontiguousarray(values)
+    values = values.astype(values.dtype.newbyteorder('<'), copy=False)
+    return {'dtype': values.dtype.str[1:], 'bdata': base64.b64encode(values.tobytes()).decode('ascii')}
+
+
+def smallest_code_dtype(count):
+    for dtype in (np.uint8, np.uint16):
+        if count <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.uint32
+
+
+def encode_projection(cube, months, dimensions, measures):
+    grouped = cube.groupby(['month', *dimensions], observed=True, sort=True)[measures].sum().reset_index()
+    encoded = {
+        'length': len(grouped),
+        'month': typed_array(months.get_indexer(grouped['month']).astype(smallest_code_dtype(len(months)))),
+        'labels': {},
+        'codes': {},
+        'measures': {},
+    }
+    for dimension in dimensions:
+        codes, labels = pd.factorize(grouped[dimension].astype(str), sort=True)
+        encoded['labels'][dimension] = labels.tolist()
+        encoded['codes'][dimension] = typed_array(codes.astype(smallest_code_dtype(len(labels))))
+    for measure in measures:
+        encoded['measures'][measure] = typed_array(grouped[measure].to_numpy(np.float64))
+    return encoded
+
+
+def encode_client_cube(cube):
+    """Monthly projections of the cube, binary encoded for a dcc.Store
+
+    Measures are float64 so every integer sum stays exact; dimension values
+    are small integer codes into a per-projection label list.
+    """
+    if cube is None or cube.empty:
+        return {'months': [], 'projections': {}}
+    months = pd.DatetimeIndex(np.unique(cube['month'].to_numpy()))
+    projections = {}
+    for name, (dimensions, measures) in CLIENT_PROJECTIONS.items():
+        if all(column in cube.columns for column in dimensions + measures):
+            projections[name] = encode_projection(cube, months, dimensions, measures)
+    return {
+        'months': months.strftime('%Y-%m-%dT%H:%M:%S').tolist(),
+        'projections': projections,
+    }
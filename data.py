@@ -1,97 +1,861 @@
+import argparse
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
 import pandas as pd
 
+from cache import LRUCache, canonical_value, outside_dates
+from client_cube import encode_client_cube
+from ingest import stream_workbook
+from metrics import record_cache, stage
+from store import ColumnStore
+
+logger = logging.getLogger(__name__)
+
+CUBE_DIMENSIONS = ['month', 'grade', 'sub_grade', 'address_state', 'purpose', 'home_ownership', 'emp_length', 'is_bad']
+AVERAGED_MEASURES = ['annual_income', 'int_rate']
+# Averages divide by the <measure>_count columns, which count only rows where the value is present.
+CUBE_MEASURES = [
+    'loan_amount', 'loan_count', 'bad_loan_amount', 'bad_loan_count',
+    *AVERAGED_MEASURES, *(f'{measure}_count' for measure in AVERAGED_MEASURES),
+]
+CATEGORY_COLUMNS = ['grade', 'sub_grade', 'address_state', 'purpose', 'home_ownership', 'emp_length', 'Good Or Bad Loan']
+FLOAT32_COLUMNS = ['annual_income', 'int_rate']
+USED_COLUMNS = ['id', 'issue_date', 'loan_amount', *FLOAT32_COLUMNS, *CATEGORY_COLUMNS]
+LABEL_COLUMNS = ['purpose', 'home_ownership', 'emp_length']
+SUNBURST_LEVELS = ('grade', 'sub_grade')
+RELOAD_POLL_SECONDS = 5.0
+DELTA_SUFFIXES = ('.csv', '.xlsx', '.xlsm')
+
+
+def compact_column(name, series):
+    if name in CATEGORY_COLUMNS:
+        return series.astype('category')
+    if name in FLOAT32_COLUMNS and pd.api.types.is_float_dtype(series.dtype):
+        return series.astype(np.float32)
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return pd.to_numeric(series, downcast='integer')
+    return series
+
+
+def compaction_report(before, after, dtypes_before, dtypes_after):
+    columns = list(before.index)
+    return pd.DataFrame({
+        'dtype_before': dtypes_before.reindex(columns).astype(str),
+        'bytes_before': before,
+        'dtype_after': dtypes_after.astype(str).reindex(columns, fill_value='dropped'),
+        'bytes_after': after.reindex(columns, fill_value=0),
+    })
+
+
+def compact_frame(df):
+    """Drop unused columns and shrink dtypes, returning the frame and a per-column memory report"""
+    compact = pd.DataFrame({
+        name: compact_column(name, df[name]) for name in df.columns if name in USED_COLUMNS
+    })
+    report = compaction_report(
+        df.memory_usage(deep=True, index=False),
+        compact.memory_usage(deep=True, index=False),
+        df.dtypes,
+        compact.dtypes,
+    )
+    return compact, report
+
+
+def derive_columns(df):
+    """Add the keys queries group by, so requests never compute or write columns"""
+    derived = {}
+    if 'grade' not in df.columns and 'sub_grade' in df.columns:
+        derived['grade'] = df['sub_grade'].astype(str).str[0].astype('category')
+    for name in LABEL_COLUMNS:
+        if name in df.columns:
+            derived[name] = df[name].astype(object).fillna('Unknown').astype(str).str.strip().astype('category')
+    if 'issue_date' in df.columns:
+        derived['month'] = df['issue_date'].to_numpy().astype('datetime64[M]').astype('datetime64[ns]')
+    if 'Good Or Bad Loan' in df.columns:
+        quality = df['Good Or Bad Loan'].astype(str).str.strip()
+        derived['is_bad'] = quality.str.contains('bad', case=False, na=False).to_numpy()
+    else:
+        derived['is_bad'] = np.zeros(len(df), dtype=bool)
+    return df.assign(**derived)
+
+
+def build_hierarchy(leaves, levels, value='loan_amount', count='loan_count', colors=None, default_color='#1B5E20'):
+    """Sunburst node arrays for any depth of `levels`, built from leaf-level sums with no row loops"""
+    paths = {level: leaves[level].astype(str) for level in levels}
+    nodes = []
+    for depth in range(1, len(levels) + 1):
+        keys = list(levels[:depth])
+        grouped = leaves.groupby([paths[k] for k in keys], observed=True, sort=True)[[value, count]].sum().reset_index()
+        ids = grouped[keys[0]]
+        parents = pd.Series('', index=grouped.index)
+        for key in keys[1:]:
+            parents = ids
+            ids = ids + '-' + grouped[key]
+        nodes.append(pd.DataFrame({
+            'id': ids,
+            'label': grouped[keys[-1]],
+            'parent': parents,
+            'value': grouped[value],
+            'loan_count': grouped[count],
+            'root': grouped[keys[0]],
+        }))
+    hierarchy = pd.concat(nodes, ignore_index=True)
+    if colors is not None:
+        hierarchy['color'] = hierarchy['root'].map(dict(colors)).fillna(default_color)
+    return {column: hierarchy[column].to_numpy() for column in hierarchy.columns}
+
+
+class LoanView:
+    """Read-only window over a contiguous run of the date-sorted loan frame"""
+
+    def __init__(self, df, rows=slice(None)):
+        self._df = df
+        self.rows = rows
+
+    def __len__(self):
+        start, stop, _ = self.rows.indices(len(self._df))
+        return max(stop - start, 0)
+
+    def __contains__(self, name):
+        return name in self._df.columns
+
+    def column(self, name):
+        """Column values for the window, sharing memory with the base frame"""
+        values = self._df[name].array[self.rows]
+        if isinstance(values, pd.arrays.NumpyExtensionArray):
+            values = values.to_numpy().view()
+            values.flags.writeable = False
+        return values
+
+    @property
+    def frame(self):
+        return self._df.iloc[self.rows]
+
+
+def cached_query(method):
+    """Memoize a DataLoader query on its canonicalized arguments and the snapshot version
+
+    The wrapped method is handed the snapshot the key was built from, so a
+    reload landing mid-call can never mix two versions of the data.
+    """
+    signature = inspect.signature(method)
+    parameters = list(signature.parameters.values())
+    public = signature.replace(parameters=parameters[:1] + parameters[2:])
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        bound = public.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        snapshot = self.snapshot
+        arguments = list(bound.arguments.items())[1:]
+        key = (method.__name__, snapshot.version) + tuple(
+            (name, canonical_value(name, value)) for name, value in arguments
+        )
+        found, result = self.query_cache.get(key)
+        record_cache('query', found)
+        if not found:
+            with stage('aggregate'):
+                result = method(self, snapshot, *args, **kwargs)
+            self.query_cache.put(key, result)
+        return result.copy()
+
+    wrapper.__signature__ = public
+    return wrapper
+
+
+def build_cube(df):
+    """Pre-aggregate loans into month x dimension cells once at load"""
+    if 'issue_date' not in df.columns or 'loan_amount' not in df.columns:
+        return None
+    cells = cube_rows(LoanView(df))
+    dimensions = [d for d in CUBE_DIMENSIONS if d in cells.columns]
+    return cells.groupby(dimensions, dropna=False, observed=True, sort=True).sum().reset_index()
+
+
+def cube_rows(view):
+    rows = {name: view.column(name) for name in CUBE_DIMENSIONS if name in view}
+    loan_amount = view.column('loan_amount')
+    rows['loan_amount'] = loan_amount.astype(np.float64 if loan_amount.dtype.kind == 'f' else np.int64)
+    rows['loan_count'] = np.ones(len(view), dtype=np.int64)
+    is_bad = view.column('is_bad')
+    rows['bad_loan_amount'] = np.where(is_bad, rows['loan_amount'], 0)
+    rows['bad_loan_count'] = is_bad.astype(np.int64)
+    for column in AVERAGED_MEASURES:
+        if column in view:
+            values = view.column(column).astype(np.float64)
+            rows[column] = values
+            rows[f'{column}_count'] = (~np.isnan(values)).astype(np.int64)
+    return pd.DataFrame(rows)
+
+
+def readonly(values):
+    values = values.view()
+    values.flags.writeable = False
+    return values
+
+
+def freeze_frame(df):
+    """The same frame rebuilt over read-only views of its arrays, so in-place writes raise"""
+    if df is None:
+        return None
+    columns = {}
+    for name in df.columns:
+        values = df[name].array
+        if isinstance(values, pd.Categorical):
+            columns[name] = pd.Categorical.from_codes(readonly(values.codes), dtype=values.dtype)
+        else:
+            columns[name] = readonly(df[name].to_numpy())
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+def prepare_tables(df):
+    """The date-sorted loan frame with derived columns, plus its cube, as stored tables"""
+    if 'issue_date' in df.columns:
+        df = df.sort_values('issue_date', kind='stable', ignore_index=True)
+    loans = derive_columns(df)
+    tables = {'loans': loans}
+    cube = build_cube(loans)
+    if cube is not None:
+        tables['cube'] = cube
+    return tables
+
+
+def merge_categories(existing, addition):
+    """Both categoricals over one category list; existing is only recoded when addition brings new values"""
+    if addition.categories.isin(existing.categories).all():
+        return existing, addition.set_categories(existing.categories)
+    categories = existing.categories.append(addition.categories.difference(existing.categories, sort=False))
+    if existing.categories.is_monotonic_increasing:
+        # Keep the sorted order astype('category') gives a full rebuild.
+        categories = categories.sort_values()
+    return existing.set_categories(categories), addition.set_categories(categories)
+
+
+def insert_rows(df, addition, positions=None):
+    """df with the rows of addition inserted before `positions`, or appended when it is None"""
+    columns = {}
+    for name in df.columns:
+        values = df[name].array
+        if isinstance(values, pd.Categorical):
+            added = addition[name].array
+            values, added = merge_categories(values, added if isinstance(added, pd.Categorical) else pd.Categorical(added))
+            values, added, dtype = values.codes, added.codes, values.dtype
+        else:
+            values, added = df[name].to_numpy(), addition[name].to_numpy()
+            common = np.result_type(values, added)
+            values, added, dtype = values.astype(common, copy=False), added.astype(common, copy=False), None
+        if positions is None:
+            merged = np.concatenate([values, added])
+        else:
+            merged = np.insert(values, positions, added)
+        columns[name] = merged if dtype is None else pd.Categorical.from_codes(merged, dtype=dtype)
+    return pd.DataFrame(columns, copy=False)
+
+
+def merge_cube(cube, addition):
+    """The cube with addition's cells summed in, re-aggregating only the months addition touches"""
+    columns = {}
+    added = {}
+    for name in cube.columns:
+        values = cube[name].array
+        if isinstance(values, pd.Categorical):
+            values, added[name] = merge_categories(values, addition[name].array)
+        else:
+            added[name] = addition[name].to_numpy()
+        columns[name] = values
+    cube = pd.DataFrame(columns, copy=False)
+    addition = pd.DataFrame(added, copy=False)
+
+    # The cube is sorted by month first, so the touched months are one contiguous run of cells.
+    months = cube['month'].to_numpy()
+    added_months = addition['month'].to_numpy()
+    start = months.searchsorted(added_months.min(), side='left')
+    stop = months.searchsorted(added_months.max(), side='right')
+    dimensions = [d for d in CUBE_DIMENSIONS if d in cube.columns]
+    touched = pd.concat([cube.iloc[start:stop], addition], ignore_index=True)
+    merged = touched.groupby(dimensions, dropna=False, observed=True, sort=True).sum().reset_index()
+    return pd.concat([cube.iloc[:start], merged, cube.iloc[stop:]], ignore_index=True)
+
+
+def conform_column(name, values, dtype):
+    """Batch values cast to the dtype the loan frame keeps the column in"""
+    if isinstance(dtype, pd.CategoricalDtype) or dtype == object:
+        return values
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return pd.to_datetime(values).astype(dtype)
+    try:
+        numeric = pd.to_numeric(values)
+    except (TypeError, ValueError) as error:
+        raise ValueError(f'Column {name} has values that are not numbers: {error}') from None
+    if pd.api.types.is_integer_dtype(dtype):
+        whole = pd.to_numeric(numeric, downcast='integer')
+        if not pd.api.types.is_integer_dtype(whole.dtype):
+            raise ValueError(f'Column {name} needs whole numbers and no missing values')
+        # Widen rather than wrap when a value does not fit the stored width.
+        return whole.astype(np.promote_types(dtype, whole.dtype))
+    return numeric.astype(dtype)
+
+
+def conform_batch(batch, loans):
+    """The batch with every column the loan frame has cast to its dtype there, raising ValueError when one cannot be"""
+    return pd.DataFrame({
+        name: conform_column(name, batch[name], loans[name].dtype) if name in loans.columns else batch[name]
+        for name in batch.columns
+    })
+
+
+def append_tables(tables, batch):
+    """Prepared tables with a compact batch of new loans merged in, plus the batch's first and last issue date
+
+    Costs a pass over the batch, a copy of each loan column and the cube
+    cells of the months the batch touches; nothing is re-sorted or
+    re-aggregated. Batch rows land after existing loans of the same date,
+    where a rebuild from the workbook with the batch appended puts them.
+    """
+    loans = tables['loans']
+    if 'issue_date' not in loans.columns or 'issue_date' not in batch.columns:
+        raise ValueError('Appending loans needs an issue_date column')
+    batch = conform_batch(batch, loans)
+    batch = derive_columns(batch.sort_values('issue_date', kind='stable', ignore_index=True))
+    missing = [name for name in loans.columns if name not in batch.columns]
+    if missing:
+        raise ValueError(f'Batch is missing columns: {", ".join(missing)}')
+    if batch.empty:
+        return tables, None
+
+    dates = loans['issue_date'].to_numpy()
+    added = batch['issue_date'].to_numpy()
+    positions = None
+    if len(dates) and added[0] < dates[-1]:
+        positions = dates.searchsorted(added, side='right')
+    merged = {'loans': insert_rows(loans, batch, positions)}
+    cube = tables.get('cube')
+    if cube is not None:
+        merged['cube'] = merge_cube(cube, build_cube(batch))
+    return merged, (added[0], added[-1])
+
+
+class Snapshot:
+    """One loaded version of the portfolio: the date-sorted frame, its date index and the cube
+
+    Built completely before it is published and immutable afterwards: every
+    array behind df, cube, issue_dates and cube_months is read-only, so any
+    number of threads may read a snapshot without locking. deltas lists the
+    delta files merged into it as (name, size, mtime_ns, first, last) with
+    the batch's first and last issue date; appended counts batches appended
+    in memory only.
+    """
+
+    def __init__(self, version, tables, source=None, deltas=(), appended=0):
+        self.version = version
+        self.source = source
+        self.deltas = tuple(deltas)
+        self.appended = appended
+        self.df = freeze_frame(tables['loans'])
+        self.issue_dates = self.df['issue_date'].to_numpy() if 'issue_date' in self.df.columns else None
+        self.cube = freeze_frame(tables.get('cube'))
+        self.cube_months = self.cube['month'].to_numpy() if self.cube is not None else None
+
+    def date_slice(self, start_date=None, end_date=None):
+        """Positional slice of the date-sorted frame covering [start_date, end_date]"""
+        if not (start_date and end_date) or self.issue_dates is None:
+            return slice(None)
+        start = self.issue_dates.searchsorted(pd.to_datetime(start_date).to_datetime64(), side='left')
+        end = self.issue_dates.searchsorted(pd.to_datetime(end_date).to_datetime64(), side='right')
+        return slice(start, max(start, end))
+
+    def view(self, start_date=None, end_date=None):
+        return LoanView(self.df, self.date_slice(start_date, end_date))
+
+    def rows(self, start_date=None, end_date=None, grades=None):
+        with stage('filter'):
+            df_filtered = self.view(start_date, end_date).frame
+            if grades and 'grade' in df_filtered.columns:
+                df_filtered = df_filtered[df_filtered['grade'].isin(grades)]
+        return df_filtered
+
+    def split_range(self, start_date, end_date):
+        """Whole months of the range as a cube slice, partial edge months as row slices"""
+        if not (start_date and end_date) or self.issue_dates is None:
+            return slice(None), []
+        start = pd.to_datetime(start_date)
+        end = pd.to_datetime(end_date)
+        first_month = start.to_period('M').to_timestamp()
+        if first_month < start:
+            first_month += pd.offsets.MonthBegin(1)
+        stop_month = (end + pd.Timedelta(1, 'ns')).to_period('M').to_timestamp()
+        if first_month >= stop_month:
+            return slice(0, 0), [self.date_slice(start, end)]
+
+        months = self.cube_months.searchsorted([first_month.to_datetime64(), stop_month.to_datetime64()])
+        rows = self.issue_dates.searchsorted(
+            [first_month.to_datetime64(), stop_month.to_datetime64()]
+        )
+        head = self.date_slice(start, end)
+        return slice(*months), [slice(head.start, rows[0]), slice(rows[1], head.stop)]
+
+    def aggregate(self, dimensions, start_date=None, end_date=None, grades=None):
+        """Cube measures summed over everything except the given dimensions"""
+        if self.cube is None:
+            return pd.DataFrame()
+        with stage('filter'):
+            months, edges = self.split_range(start_date, end_date)
+            parts = [self.cube.iloc[months]]
+            parts += [cube_rows(LoanView(self.df, edge)) for edge in edges if edge.stop > edge.start]
+            cells = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+            if grades and 'grade' in cells.columns:
+                cells = cells[cells['grade'].isin(grades)]
+        if cells.empty:
+            return pd.DataFrame()
+        measures = [m for m in CUBE_MEASURES if m in cells.columns]
+        return cells.groupby(list(dimensions), observed=True, sort=True)[measures].sum()
+
+
 class DataLoader:
-    def __init__(self, file_path):
+    """Serves portfolio queries from the current Snapshot
+
+    Concurrency: readers never lock. Each query reads self.snapshot once and
+    works only on that immutable snapshot; query results are copies the
+    caller owns. Loads are serialized by a lock and publish the next
+    snapshot in a single assignment.
+
+    The version names the data rather than counting loads: it is derived
+    from the column store's workbook hash, build time and folded deltas, so
+    every worker serving the same store reports the same version, and
+    reloading unchanged data keeps it.
+
+    New loans arrive without replacing the workbook: append() writes a
+    batch to the delta directory, portfolio.deltas/ next to portfolio.xlsx by
+    default, and batch files (.csv, .xlsx) can be dropped there directly.
+    New deltas are folded into the column store once, by whichever process
+    sees them first, and every worker maps the merged tables. Deltas apply
+    in name order, so name them by arrival time; editing or removing one
+    that was folded rebuilds from the workbook.
+    """
+
+    def __init__(self, file_path, store_dir=None, query_cache=None, delta_dir=None):
         self.file_path = file_path
-        self.df = None
+        self.store = ColumnStore(file_path, store_dir)
+        self.delta_dir = delta_dir or os.path.splitext(file_path)[0] + '.deltas'
+        self.query_cache = query_cache if query_cache is not None else LRUCache()
+        # Called as listener(old_version, new_version, unaffected) whenever a snapshot replaces another.
+        self.append_listeners = []
+        self.snapshot = None
+        self._watcher = None
+        self._load_lock = threading.Lock()
+        self._pending_source = None
+        self._failed_source = None
+        self._pending_deltas = None
+        self._failed_deltas = set()
         self.load_data()
-    
+
+    @property
+    def version(self):
+        return self.snapshot.version if self.snapshot is not None else None
+
+    @property
+    def df(self):
+        return self.snapshot.df if self.snapshot is not None else None
+
+    def source_stat(self):
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
     def load_data(self):
-        self.df = pd.read_excel(self.file_path)
-        if 'issue_date' in self.df.columns:
-            self.df['issue_date'] = pd.to_datetime(self.df['issue_date'])
+        """Build a snapshot of the current workbook and publish it in a single assignment"""
+        with self._load_lock:
+            self._load_snapshot()
+
+    def _load_snapshot(self):
+        source = self.source_stat()
+        previous = self.snapshot
+        tables, deltas = self.load_tables()
+        self.snapshot = Snapshot(self.data_version(deltas), tables, source, deltas)
+        self._keep_unaffected(previous, self.snapshot)
+
+    def data_version(self, deltas):
+        """Version for the stored tables plus deltas: '<stamp>-<hash>', where later data sorts greater
+
+        The hash covers the workbook's sha256 and the folded deltas; the stamp
+        is the store's build time, or the newest file's mtime without a store.
+        """
+        source = self.store.source or {}
+        stamp = self.store.built_ns or max([source.get('mtime_ns') or 0] + [delta[2] for delta in deltas])
+        identity = json.dumps([source.get('sha256'), [list(delta[:3]) for delta in deltas]])
+        return f'{stamp:020d}-{hashlib.sha256(identity.encode("utf-8")).hexdigest()[:12]}'
+
+    def load_tables(self):
+        """The column store's tables with every delta file folded in, and the folded deltas
+
+        A store that is behind is converted or folded first, under the store's
+        build lock, so one process does the work and the others map its result.
+        """
+        started = time.perf_counter()
+        tables, new = self._stored_tables()
+        if tables is not None and not new:
+            logger.info('Loaded %s from column store in %.3fs', self.file_path, time.perf_counter() - started)
+            return tables, self.store.deltas
+        with self.store.build_lock():
+            # Another worker may have finished the build or fold while we waited.
+            tables, new = self._stored_tables()
+            if tables is None:
+                tables, deltas = self.build_store()
+                logger.info('Converted %s to column store in %.2fs', self.file_path, time.perf_counter() - started)
+            elif new:
+                tables, deltas = self.fold_deltas(tables, self.store.deltas, new)
+                logger.info(
+                    'Folded %d delta files into the column store in %.2fs', len(new), time.perf_counter() - started
+                )
+            else:
+                deltas = self.store.deltas
+        return tables, deltas
+
+    def _stored_tables(self):
+        """The mapped store and the delta files it lacks, or (None, None) when it must be rebuilt from the workbook"""
+        tables = self.store.load()
+        if tables is None:
+            return None, None
+        deltas = self.delta_files()
+        if any(delta[:3] not in deltas for delta in self.store.deltas):
+            # A folded delta was edited or removed.
+            return None, None
+        folded = {delta[0] for delta in self.store.deltas}
+        return tables, [delta for delta in deltas if delta[0] not in folded and delta not in self._failed_deltas]
+
+    def merge_deltas(self, tables, deltas):
+        """Tables with the readable delta files appended, and their (name, size, mtime_ns, first, last) records"""
+        merged = []
+        for delta in deltas:
+            try:
+                tables, dates = append_tables(tables, self.read_delta(delta[0]))
+            except Exception:
+                self._failed_deltas.add(delta)
+                logger.exception('Skipping delta %s', delta[0])
+                continue
+            span = (None, None) if dates is None else tuple(pd.Timestamp(date).isoformat() for date in dates)
+            merged.append(delta + span)
+        return tables, merged
+
+    def fold_deltas(self, tables, folded, deltas):
+        """Merge new delta files into the stored tables and save them back, returning the tables and all folded deltas"""
+        tables, merged = self.merge_deltas(tables, deltas)
+        if not merged:
+            return tables, folded
+        folded = list(folded) + merged
+        if self.store.save(tables, info=self.store.info, deltas=folded):
+            return self.store.load() or tables, folded
+        return tables, folded
+
+    def _keep_unaffected(self, previous, snapshot):
+        """Carry cached results over to a snapshot that only adds whole deltas to the previous one, else drop them"""
+        if previous is None:
+            self.query_cache.clear()
+            return
+        if (
+            previous.appended
+            or previous.source != snapshot.source
+            or not set(previous.deltas) <= set(snapshot.deltas)
+        ):
+            # Listeners still hear of the new version, which may sort before the old one.
+            self._carry_forward(previous.version, snapshot.version, lambda key: False)
+            return
+        spans = [
+            outside_dates(delta[3], delta[4])
+            for delta in snapshot.deltas
+            if delta not in previous.deltas and delta[3] is not None
+        ]
+        self._carry_forward(previous.version, snapshot.version, lambda key: all(span(key) for span in spans))
+
+    def _carry_forward(self, old_version, new_version, unaffected):
+        self.query_cache.carry_forward(old_version, new_version, unaffected)
+        for listener in self.append_listeners:
+            listener(old_version, new_version, unaffected)
+
+    def delta_files(self):
+        """(name, size, mtime_ns) of the batch files in the delta directory, in the order they apply"""
+        try:
+            names = sorted(os.listdir(self.delta_dir))
+        except OSError:
+            return []
+        deltas = []
+        for name in names:
+            if name.startswith('.') or not name.lower().endswith(DELTA_SUFFIXES):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.delta_dir, name))
+            except OSError:
+                continue
+            deltas.append((name, stat.st_size, stat.st_mtime_ns))
+        return deltas
+
+    def read_delta(self, name):
+        path = os.path.join(self.delta_dir, name)
+        if name.lower().endswith('.csv'):
+            return compact_frame(pd.read_csv(path, parse_dates=['issue_date']))[0]
+        return self.read_file(path)[0]
+
+    def write_delta(self, batch):
+        """Save a compact batch to the delta directory atomically, where the next load folds it into the store"""
+        os.makedirs(self.delta_dir, exist_ok=True)
+        now = time.time()
+        name = f'{time.strftime("%Y%m%dT%H%M%S", time.gmtime(now))}.{int(now * 1e6) % 1000000:06d}-{os.getpid()}.csv'
+        path = os.path.join(self.delta_dir, name)
+        partial = os.path.join(self.delta_dir, f'.{name}.tmp')
+        batch.to_csv(partial, index=False)
+        os.replace(partial, path)
+        stat = os.stat(path)
+        return name, stat.st_size, stat.st_mtime_ns
+
+    def append(self, batch, persist=True):
+        """Merge a frame of new loans, in the workbook's columns, into the data and publish the next version
+
+        Columns are cast to the dtypes the snapshot keeps them in, raising
+        ValueError for values that cannot be. Only cached results whose date
+        range misses the batch are kept. With persist the batch is written to
+        the delta directory and folded into the column store; without, it
+        lives in this process only, until the next load. Returns the new
+        version.
+        """
+        compact, _ = compact_frame(batch)
+        with self._load_lock:
+            if not persist:
+                return self._append_snapshot(compact)
+            # Check the batch merges before writing it where every worker will read it.
+            append_tables({'loans': self.snapshot.df.iloc[:0]}, compact)
+            self.write_delta(compact)
+            self._load_snapshot()
+            return self.version
+
+    def apply_deltas(self):
+        """Pick up delta files added, edited or removed since the snapshot was built
+
+        Returns True when a new version was published. Like the workbook, a
+        changed directory is only loaded once it has been unchanged for one poll.
+        """
+        deltas = [delta for delta in self.delta_files() if delta not in self._failed_deltas]
+        if set(deltas) == {delta[:3] for delta in self.snapshot.deltas}:
+            self._pending_deltas = None
+            return False
+        if deltas != self._pending_deltas:
+            # Still being written, or just appeared: wait for one quiet poll.
+            self._pending_deltas = deltas
+            return False
+        self._pending_deltas = None
+        previous = self.version
+        try:
+            self.load_data()
+        except Exception:
+            logger.exception('Loading deltas from %s failed, keeping version %s', self.delta_dir, previous)
+            return False
+        logger.info('Loaded deltas from %s as version %s', self.delta_dir, self.version)
+        return self.version != previous
+
+    def _append_snapshot(self, batch):
+        snapshot = self.snapshot
+        started = time.perf_counter()
+        tables = {'loans': snapshot.df}
+        if snapshot.cube is not None:
+            tables['cube'] = snapshot.cube
+        tables, dates = append_tables(tables, batch)
+        # Only this process has the batch, so the version is only meaningful here too.
+        identity = f'{snapshot.version}+{snapshot.appended + 1}'.encode('utf-8')
+        version = f'{time.time_ns():020d}-{hashlib.sha256(identity).hexdigest()[:12]}'
+        self.snapshot = Snapshot(version, tables, snapshot.source, snapshot.deltas, snapshot.appended + 1)
+        self._carry_forward(
+            snapshot.version, self.snapshot.version, outside_dates(*dates) if dates else lambda key: True
+        )
+        logger.info(
+            'Appended %d loans in memory as version %s in %.3fs',
+            len(batch), self.snapshot.version, time.perf_counter() - started,
+        )
+        return self.snapshot.version
+
+    def reload_if_changed(self):
+        """Swap in a new snapshot once the workbook has changed and stopped changing
+
+        Returns True when a new version was published. A workbook that fails to
+        load keeps the current snapshot and is not retried until it changes again.
+        """
+        source = self.source_stat()
+        if source is None or source == self.snapshot.source or source == self._failed_source:
+            self._pending_source = None
+            return False
+        if source != self._pending_source:
+            # Still being written, or just appeared: wait for one quiet poll.
+            self._pending_source = source
+            return False
+        self._pending_source = None
+        previous = self.version
+        try:
+            self.load_data()
+        except Exception:
+            self._failed_source = source
+            logger.exception('Reloading %s failed, keeping version %s', self.file_path, previous)
+            return False
+        logger.info('Reloaded %s as version %s', self.file_path, self.version)
+        return self.version != previous
+
+    def start_watcher(self, poll_seconds=RELOAD_POLL_SECONDS, on_reload=None):
+        """Poll the workbook from a daemon thread, reloading off the request path"""
+        if self._watcher is not None:
+            return
+        stop = threading.Event()
+
+        def watch():
+            while not stop.wait(poll_seconds):
+                changed = self.reload_if_changed()
+                changed = self.apply_deltas() or changed
+                if changed and on_reload is not None:
+                    on_reload()
+
+        thread = threading.Thread(target=watch, name='portfolio-watcher', daemon=True)
+        self._watcher = (thread, stop)
+        thread.start()
+
+    def stop_watcher(self):
+        if self._watcher is None:
+            return
+        thread, stop = self._watcher
+        stop.set()
+        thread.join()
+        self._watcher = None
+
+    def build_store(self):
+        """Convert the workbook plus its deltas into the column store, returning the tables, mapped when possible, and the deltas"""
+        df, report = self.read_source()
+        tables = prepare_tables(df)
+        logger.info(
+            'Loan frame memory: %.1f MB -> %.1f MB',
+            report['bytes_before'].sum() / 1e6, report['bytes_after'].sum() / 1e6,
+        )
+        deltas = [delta for delta in self.delta_files() if delta not in self._failed_deltas]
+        tables, deltas = self.merge_deltas(tables, deltas)
+        info = {'memory_report': report.reset_index(names='column').to_dict('records')}
+        if self.store.save(tables, info=info, deltas=deltas):
+            # Serve from the mapped files too, rather than keeping a private copy.
+            return self.store.load() or tables, deltas
+        return tables, deltas
+
+    def read_source(self):
+        """Parse the workbook into the compact frame plus its memory report"""
+        return self.read_file(self.file_path)
+
+    def read_file(self, path):
+        if path.lower().endswith(('.xlsx', '.xlsm')):
+            return self.stream_file(path)
+        df = pd.read_excel(path)
+        if 'issue_date' in df.columns:
+            df['issue_date'] = pd.to_datetime(df['issue_date'])
+        return compact_frame(df)
+
+    def stream_file(self, path):
+        data, sources = stream_workbook(
+            path,
+            USED_COLUMNS,
+            text_columns=CATEGORY_COLUMNS,
+            float32_columns=FLOAT32_COLUMNS,
+            date_columns=['issue_date'],
+        )
+        df = pd.DataFrame({name: compact_column(name, pd.Series(values)) for name, values in data.items()})
+        report = compaction_report(
+            pd.Series({name: size for name, (_, size) in sources.items()}),
+            df.memory_usage(deep=True, index=False),
+            pd.Series({name: dtype for name, (dtype, _) in sources.items()}),
+            df.dtypes,
+        )
+        return df, report
+
+    def memory_report(self):
+        """Per-column bytes of the source frame before and after compaction"""
+        records = self.store.info.get('memory_report') if self.store.info else None
+        if not records:
+            return pd.DataFrame()
+        report = pd.DataFrame(records).set_index('column')
+        totals = report[['bytes_before', 'bytes_after']].sum()
+        report.loc['total'] = ['', totals['bytes_before'], '', totals['bytes_after']]
+        return report
     
     def get_filtered_data(self, start_date=None, end_date=None, grades=None):
-        df_filtered = self.df.copy()
-        if start_date and end_date and 'issue_date' in df_filtered.columns:
-            start_date = pd.to_datetime(start_date)
-            end_date = pd.to_datetime(end_date)
-            df_filtered = df_filtered[
-                (df_filtered['issue_date'] >= start_date) & 
-                (df_filtered['issue_date'] <= end_date)
-            ]
-        if grades and 'grade' in df_filtered.columns:
-            df_filtered = df_filtered[df_filtered['grade'].isin(grades)]
-        return df_filtered
-    
-    def get_monthly_data(self, start_date=None, end_date=None, grades=None):
-        df_filtered = self.get_filtered_data(start_date, end_date, grades)
-        if df_filtered.empty:
+        """Rows in the date range, a view of the snapshot frame that callers must not modify"""
+        return self.snapshot.rows(start_date, end_date, grades)
+
+    @cached_query
+    def get_monthly_data(self, snapshot, start_date=None, end_date=None, grades=None):
+        monthly_data = snapshot.aggregate(['month', 'grade'], start_date, end_date, grades)
+        if monthly_data.empty:
             return pd.DataFrame()
-        df_filtered['month'] = df_filtered['issue_date'].dt.to_period('M').dt.to_timestamp()
-        monthly_data = df_filtered.groupby(['month', 'grade'])['loan_amount'].sum().reset_index()
-        pivot_df = monthly_data.pivot(index='month', columns='grade', values='loan_amount')
+        pivot_df = monthly_data['loan_amount'].unstack('grade')
         return pivot_df.fillna(0)
     
-    def get_state_loan_data(self, start_date=None, end_date=None):
-        df_filtered = self.get_filtered_data(start_date, end_date)
-        if df_filtered.empty or 'address_state' not in df_filtered.columns:
+    @cached_query
+    def get_state_loan_data(self, snapshot, start_date=None, end_date=None):
+        if snapshot.cube is None or 'address_state' not in snapshot.cube.columns:
             return pd.DataFrame()
-        state_data = df_filtered.groupby('address_state').agg({
-            'loan_amount': 'sum',
-            'id': 'count',
-            'annual_income': 'mean'
-        }).reset_index()
-        state_data.columns = ['state', 'total_loan_amount', 'loan_count', 'avg_income']
-        if 'Good Or Bad Loan' in df_filtered.columns:
-            df_filtered['Good Or Bad Loan'] = df_filtered['Good Or Bad Loan'].astype(str).str.strip()
-            bad_loans_mask = df_filtered['Good Or Bad Loan'].str.contains('bad', case=False, na=False)
-            bad_loans_df = df_filtered[bad_loans_mask]
-            if len(bad_loans_df) > 0:
-                bad_loans = bad_loans_df.groupby('address_state').agg({
-                    'id': 'count',
-                    'loan_amount': 'sum'
-                }).reset_index()
-                bad_loans.columns = ['state', 'bad_loan_count', 'bad_loan_amount']
-                state_data = pd.merge(state_data, bad_loans, on='state', how='left')
-            else:
-                state_data['bad_loan_count'] = 0
-                state_data['bad_loan_amount'] = 0.0
-        else:
-            state_data['bad_loan_count'] = 0
-            state_data['bad_loan_amount'] = 0.0
-        state_data['bad_loan_count'] = state_data['bad_loan_count'].fillna(0).astype(int)
-        state_data['bad_loan_amount'] = state_data['bad_loan_amount'].fillna(0).astype(float)
-        state_data['bad_loan_pct'] = state_data.apply(
-            lambda row: (row['bad_loan_amount'] / row['total_loan_amount'] * 100) if row['total_loan_amount'] > 0 else 0,
-            axis=1
-        ).round(2)
-        state_data['avg_income'] = state_data['avg_income'].round(0).astype(int)
-        state_data['total_loan_amount'] = state_data['total_loan_amount'].astype(float)
+        grouped = snapshot.aggregate(['address_state'], start_date, end_date)
+        if grouped.empty:
+            return pd.DataFrame()
+        total_amount = grouped['loan_amount'].astype(float)
+        bad_amount = grouped['bad_loan_amount'].astype(float)
+        state_data = pd.DataFrame({
+            'state': grouped.index,
+            'total_loan_amount': total_amount.to_numpy(),
+            'loan_count': grouped['loan_count'].to_numpy(),
+            # Int64 keeps states where every income is missing as <NA> instead of failing the cast.
+            'avg_income': (grouped['annual_income'] / grouped['annual_income_count']).round(0).astype('Int64').array,
+            'bad_loan_count': grouped['bad_loan_count'].astype(int).to_numpy(),
+            'bad_loan_amount': bad_amount.to_numpy(),
+        })
+        bad_loan_pct = (bad_amount / total_amount * 100).where(total_amount > 0, 0.0)
+        state_data['bad_loan_pct'] = bad_loan_pct.round(2).to_numpy()
         return state_data
     
-    def get_risk_subgrade_data(self, start_date=None, end_date=None, grade=None):
-        df_filtered = self.get_filtered_data(start_date, end_date)
-        if df_filtered.empty:
+    @cached_query
+    def get_risk_subgrade_data(self, snapshot, start_date=None, end_date=None, grade=None):
+        """Loan totals per grade, or per sub_grade within `grade` when one is given"""
+        if grade:
+            grouped = snapshot.aggregate(['sub_grade'], start_date, end_date, grades=[grade])
+        else:
+            grouped = snapshot.aggregate(['grade'], start_date, end_date)
+        if grouped.empty:
             return pd.DataFrame()
-        if 'sub_grade' in df_filtered.columns and 'grade' not in df_filtered.columns:
-            df_filtered['grade'] = df_filtered['sub_grade'].str[0]
-        if grade and 'grade' in df_filtered.columns:
-            df_filtered = df_filtered[df_filtered['grade'] == grade]
-        return df_filtered
+        return grouped[['loan_amount', 'loan_count']].reset_index()
     
-    def get_bar_chart_data(self, variable, start_date=None, end_date=None, top_n=10):
-        df_filtered = self.get_filtered_data(start_date, end_date)
-        if df_filtered.empty or variable not in df_filtered.columns:
-            return pd.DataFrame()
-        df_filtered[variable] = df_filtered[variable].fillna('Unknown').astype(str).str.strip()
-        grouped_data = df_filtered.groupby(variable).agg({
-            'loan_amount': 'sum',
-            'id': 'count',
-            'annual_income': 'mean',
-            'int_rate': 'mean'
-        }).reset_index()
-        grouped_data.columns = [variable, 'total_amount', 'loan_count', 'avg_income', 'avg_int_rate']
+    @cached_query
+    def get_bar_chart_data(self, snapshot, variable, start_date=None, end_date=None, top_n=10):
+        if snapshot.cube is not None and variable in snapshot.cube.columns and variable in CUBE_DIMENSIONS:
+            grouped = snapshot.aggregate([variable], start_date, end_date)
+            if grouped.empty:
+                return pd.DataFrame()
+            grouped_data = pd.DataFrame({
+                variable: grouped.index.astype(str),
+                'total_amount': grouped['loan_amount'].to_numpy(),
+                'loan_count': grouped['loan_count'].to_numpy(),
+                'avg_income': (grouped['annual_income'] / grouped['annual_income_count']).to_numpy(),
+                'avg_int_rate': (grouped['int_rate'] / grouped['int_rate_count']).to_numpy(),
+            })
+        else:
+            df_filtered = snapshot.rows(start_date, end_date)
+            if df_filtered.empty or variable not in df_filtered.columns:
+                return pd.DataFrame()
+            categories = df_filtered[variable].astype(object).fillna('Unknown').astype(str).str.strip()
+            grouped_data = df_filtered.groupby(categories).agg({
+                'loan_amount': 'sum',
+                'id': 'count',
+                'annual_income': 'mean',
+                'int_rate': 'mean'
+            }).reset_index()
+            grouped_data.columns = [variable, 'total_amount', 'loan_count', 'avg_income', 'avg_int_rate']
         grouped_data = grouped_data.sort_values('total_amount', ascending=False)
         if top_n < len(grouped_data):
             grouped_data = grouped_data.head(top_n)
@@ -100,47 +864,52 @@ class DataLoader:
         grouped_data['avg_int_rate'] = grouped_data['avg_int_rate'].round(2)
         return grouped_data
     
-    def get_sunburst_data(self, start_date=None, end_date=None):
-        df_filtered = self.get_filtered_data(start_date, end_date)
-        if df_filtered.empty:
+    @cached_query
+    def get_sunburst_data(self, snapshot, start_date=None, end_date=None, levels=SUNBURST_LEVELS, colors=None):
+        if snapshot.cube is None or any(level not in snapshot.cube.columns for level in levels):
             return pd.DataFrame()
-        if 'sub_grade' not in df_filtered.columns or 'loan_amount' not in df_filtered.columns:
+        leaves = snapshot.aggregate(list(levels), start_date, end_date)
+        if leaves.empty:
             return pd.DataFrame()
-        if 'grade' not in df_filtered.columns and 'sub_grade' in df_filtered.columns:
-            df_filtered['grade'] = df_filtered['sub_grade'].str[0]
-        sunburst_data = []
-        grade_data = df_filtered.groupby('grade').agg({'loan_amount': 'sum', 'id': 'count'}).reset_index()
-        for _, row in grade_data.iterrows():
-            sunburst_data.append({
-                'id': row['grade'],
-                'label': row['grade'],
-                'parent': '',
-                'value': row['loan_amount'],
-                'loan_count': row['id']
-            })
-        subgrade_data = df_filtered.groupby(['grade', 'sub_grade']).agg({'loan_amount': 'sum', 'id': 'count'}).reset_index()
-        for _, row in subgrade_data.iterrows():
-            sunburst_data.append({
-                'id': f"{row['grade']}-{row['sub_grade']}",
-                'label': row['sub_grade'],
-                'parent': row['grade'],
-                'value': row['loan_amount'],
-                'loan_count': row['id']
-            })
-        return pd.DataFrame(sunburst_data)
+        return pd.DataFrame(build_hierarchy(leaves.reset_index(), levels, colors=colors))
     
+    @cached_query
+    def get_client_cube(self, snapshot):
+        """Monthly cube projections for browser-side filtering, see client_cube.py"""
+        payload = encode_client_cube(snapshot.cube)
+        payload['version'] = snapshot.version
+        return payload
+
     def get_date_range(self):
-        if self.df is not None and 'issue_date' in self.df.columns:
-            return self.df['issue_date'].min(), self.df['issue_date'].max()
+        df = self.df
+        if df is not None and 'issue_date' in df.columns:
+            return df['issue_date'].min(), df['issue_date'].max()
         return None, None
     
     def get_unique_grades(self):
-        if self.df is not None and 'grade' in self.df.columns:
-            return sorted(self.df['grade'].unique().tolist())
+        df = self.df
+        if df is not None and 'grade' in df.columns:
+            return sorted(df['grade'].unique().tolist())
         return []
     
     def get_unique_values_for_variable(self, variable):
-        if self.df is not None and variable in self.df.columns:
-            values = self.df[variable].dropna().unique().tolist()
+        df = self.df
+        if df is not None and variable in df.columns:
+            values = df[variable].dropna().unique().tolist()
             return sorted([str(v).strip() for v in values])
         return []
+
+
+def main(argv=None):
+    """Build the column store ahead of time, so app workers start by mapping it"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('file_path', nargs='?', default='portfolio.xlsx')
+    parser.add_argument('--store-dir')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(name)s: %(message)s')
+    data_loader = DataLoader(args.file_path, args.store_dir)
+    print(data_loader.memory_report().to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import logging
+import sys
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 50_000
+OBJECT_POINTER_BYTES = 8
+
+
+def log_progress(rows_read, total_rows):
+    if total_rows:
+        logger.info('Read %s / %s rows', f'{rows_read:,}', f'{total_rows:,}')
+    else:
+        logger.info('Read %s rows', f'{rows_read:,}')
+
+
+class _TextColumn:
+    """Encodes streamed text cells straight into integer codes"""
+
+    def __init__(self):
+        self.lookup = {}
+        self.chunks = []
+
+    def add(self, values):
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=True)
+        mapping = np.array([self.lookup.setdefault(str(value), len(self.lookup)) for value in uniques], dtype=np.int32)
+        self.chunks.append(np.where(codes >= 0, mapping[codes] if len(mapping) else -1, -1).astype(np.int32))
+
+    def finish(self):
+        codes = np.concatenate(self.chunks) if self.chunks else np.empty(0, dtype=np.int32)
+        labels = np.array(list(self.lookup), dtype=object)
+        order = np.argsort(labels.astype(str), kind='stable')
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        codes = np.where(codes >= 0, rank[codes] if len(rank) else -1, -1)
+        categorical = pd.Categorical.from_codes(codes, categories=labels[order])
+
+        sizes = np.array([sys.getsizeof(label) for label in labels[order]], dtype=np.int64)
+        present = codes[codes >= 0]
+        object_bytes = int(np.bincount(present, minlength=len(sizes)) @ sizes) if len(sizes) else 0
+        missing_bytes = int((codes < 0).sum()) * sys.getsizeof(np.nan)
+        before = len(codes) * OBJECT_POINTER_BYTES + object_bytes + missing_bytes
+        return categorical, 'object', before
+
+
+class _NumberColumn:
+    def __init__(self, dtype=None):
+        self.dtype = dtype
+        self.chunks = []
+
+    def add(self, values):
+        parsed = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy()
+        if self.dtype is not None:
+            parsed = parsed.astype(self.dtype)
+        self.chunks.append(parsed)
+
+    def finish(self):
+        values = np.concatenate(self.chunks) if self.chunks else np.empty(0)
+        # read_excel keeps every numeric column at 64 bits.
+        source_dtype = 'float64' if values.dtype.kind == 'f' else str(values.dtype)
+        return values, source_dtype, len(values) * 8
+
+
+class _DateColumn:
+    def __init__(self):
+        self.chunks = []
+
+    def add(self, values):
+        self.chunks.append(pd.to_datetime(pd.Series(values, dtype=object)).to_numpy(dtype='datetime64[ns]'))
+
+    def finish(self):
+        values = np.concatenate(self.chunks) if self.chunks else np.empty(0, dtype='datetime64[ns]')
+        return values, 'datetime64[ns]', len(values) * 8
+
+
+def stream_workbook(path, columns, text_columns=(), float32_columns=(), date_columns=(),
+                    chunk_rows=CHUNK_ROWS, progress=log_progress):
+    """Read only `columns` of the first sheet, converting each chunk of rows to typed arrays
+
+    Returns the columns (in sheet order) and, per column, the (dtype, bytes)
+    pandas would have held for it as read by read_excel.
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, ())
+        positions = {name: i for i, name in enumerate(header) if name in columns}
+        builders = {}
+        for name in positions:
+            if name in text_columns:
+                builders[name] = _TextColumn()
+            elif name in date_columns:
+                builders[name] = _DateColumn()
+            else:
+                builders[name] = _NumberColumn(np.float32 if name in float32_columns else None)
+
+        total_rows = sheet.max_row - 1 if sheet.max_row else None
+        rows_read = 0
+        chunk = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                _flush(chunk, positions, builders)
+                rows_read += len(chunk)
+                chunk = []
+                if progress:
+                    progress(rows_read, total_rows)
+        if chunk:
+            _flush(chunk, positions, builders)
+            rows_read += len(chunk)
+        if progress:
+            progress(rows_read, rows_read)
+    finally:
+        workbook.close()
+
+    data, sources = {}, {}
+    for name, builder in builders.items():
+        data[name], *sources[name] = builder.finish()
+    return data, sources
+
+
+def _flush(chunk, positions, builders):
+    for name, position in positions.items():
+        builders[name].add([row[position] if position < len(row) else None for row in chunk])
@@ -5,7 +5,7 @@ from layout.third_layout import build_risk_subgrade_layout
 from layout.fourth_layout import build_sunburst_chart_layout  
 from layout.fifth_layout import build_bar_chart_layout  
 
-def create_dashboard_layout(data_loader, extra_sections=None):
+def create_dashboard_layout(data_loader, extra_sections=None, client_cube=False):
     
     risk_subgrade_section = build_risk_subgrade_layout(data_loader)
     sunburst_section = build_sunburst_chart_layout(data_loader) 
@@ -42,8 +42,30 @@ def create_dashboard_layout(data_loader, extra_sections=None):
             ]),
         ]),
         
-        dcc.Store(id='app-state', data={}),
+        dcc.Store(id='app-state', data={'version': data_loader.version} if data_loader else {}),
         dcc.Interval(id='update-interval', interval=30000, n_intervals=0)
     ]
+
+    if client_cube:
+        # Filled once per page load and data version; browser-filtered charts re-aggregate it.
+        layout_children.append(dcc.Store(id='client-cube'))
     
     return html.Div(className="dashboard-layout", children=layout_children)
+
+
+def create_loading_layout(status):
+    """Placeholder page served until the data snapshot is published; it reloads itself once /ready passes"""
+
+    if status.get('error'):
+        message = f"Could not load portfolio data: {status['error']}"
+    else:
+        message = "Loading portfolio data…"
+
+    return html.Div(className="dashboard-layout", children=[
+        html.Div(className="dashboard-header", children=[
+            html.H1("Loan Portfolio Dashboard", className="dashboard-title"),
+            html.P(message, className="dashboard-subtitle"),
+        ]),
+        dcc.Interval(id='startup-poll', interval=1000, n_intervals=0, disabled=bool(status.get('error'))),
+        dcc.Store(id='startup-state'),
+    ])
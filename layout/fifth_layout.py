@@ -1,16 +1,16 @@
 from dash import dcc, html
 
+BAR_VARIABLE_OPTIONS = [
+    {"label": "Purpose", "value": "purpose"},
+    {"label": "Home Ownership", "value": "home_ownership"},
+    {"label": "Employment Length", "value": "emp_length"},
+]
+
 def build_bar_chart_layout(data_loader):
     """Build horizontal bar chart layout for categorical analysis"""
 
     start_date, end_date = data_loader.get_date_range() if data_loader else (None, None)
 
-    bar_variable_options = [
-        {"label": "Purpose", "value": "purpose"},
-        {"label": "Home Ownership", "value": "home_ownership"},
-        {"label": "Employment Length", "value": "emp_length"},
-    ]
-
     return html.Div(
         className="barChart-layout",
         children=[
@@ -25,7 +25,7 @@ def build_bar_chart_layout(data_loader):
                                 children=[
                                     dcc.Dropdown(
                                         id="barChart-variableDropdown",
-                                        options=bar_variable_options,
+                                        options=BAR_VARIABLE_OPTIONS,
                                         value="purpose",
                                         clearable=False,
                                         className="barChart-variableDropdown",
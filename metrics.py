@@ -0,0 +1,207 @@
+import contextlib
+import functools
+import threading
+import time
+from collections import defaultdict
+
+from profiling import profiled
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UPDATE_PATH = '/_dash-update-component'
+
+_local = threading.local()
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_label_value(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[tuple(labels)] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.label_names, labels)} {value:g}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        labels = tuple(labels)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(
+                        f'{self.name}_bucket{_labels(self.label_names, labels, [("le", f"{bound:g}")])} {cumulative}'
+                    )
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, [("le", "+Inf")])} {count}')
+                lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {total:.6f}')
+                lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {count}')
+        return lines
+
+
+CALLBACK_SECONDS = Histogram(
+    'dashboard_callback_seconds', 'Wall time of each Dash callback, from inputs to returned outputs', ['callback']
+)
+STAGE_SECONDS = Histogram(
+    'dashboard_callback_stage_seconds',
+    'Exclusive time per callback stage: filter, aggregate, figure, serialize, other, and response '
+    '(Dash decoding the request and encoding the outputs)',
+    ['callback', 'stage'],
+)
+ERRORS = Counter('dashboard_callback_errors_total', 'Callbacks that returned the error figure', ['callback'])
+EMPTY_RESULTS = Counter(
+    'dashboard_callback_empty_results_total', 'Empty-state figures built (cached ones are not recounted)', ['callback']
+)
+CACHE_REQUESTS = Counter('dashboard_cache_requests_total', 'Query and figure cache lookups', ['callback', 'cache', 'result'])
+METRICS = [CALLBACK_SECONDS, STAGE_SECONDS, ERRORS, EMPTY_RESULTS, CACHE_REQUESTS]
+
+
+class _CallFrame:
+    """Stage stack of the callback running on this thread; time goes to the innermost stage"""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.stack = ['other']
+        self.stages = defaultdict(float)
+        self.mark = time.perf_counter()
+
+    def switch(self, now):
+        self.stages[self.stack[-1]] += now - self.mark
+        self.mark = now
+
+
+def current_callback():
+    frame = getattr(_local, 'frame', None)
+    return frame.callback if frame is not None else None
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Attribute the enclosed time to `name`, excluding any stages nested inside it"""
+    frame = getattr(_local, 'frame', None)
+    if frame is None:
+        yield
+        return
+    frame.switch(time.perf_counter())
+    frame.stack.append(name)
+    try:
+        yield
+    finally:
+        frame.switch(time.perf_counter())
+        frame.stack.pop()
+
+
+def instrumented(callback):
+    """Record latency and per-stage time for a Dash callback under its function name"""
+    name = callback.__name__
+    callback = profiled(callback)
+
+    @functools.wraps(callback)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, 'frame', None)
+        frame = _local.frame = _CallFrame(name)
+        started = frame.mark
+        try:
+            return callback(*args, **kwargs)
+        finally:
+            now = time.perf_counter()
+            frame.switch(now)
+            _local.frame = previous
+            _local.finished = (name, now - started)
+            CALLBACK_SECONDS.observe((name,), now - started)
+            for stage_name, seconds in frame.stages.items():
+                STAGE_SECONDS.observe((name, stage_name), seconds)
+
+    return wrapper
+
+
+def record_error():
+    callback = current_callback()
+    if callback:
+        ERRORS.inc((callback,))
+
+
+def record_empty():
+    callback = current_callback()
+    if callback:
+        EMPTY_RESULTS.inc((callback,))
+
+
+def record_cache(cache, hit):
+    callback = current_callback()
+    if callback:
+        CACHE_REQUESTS.inc((callback, cache, 'hit' if hit else 'miss'))
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+def register_metrics_route(server, path='/metrics'):
+    """Serve Prometheus text on `path`, and time Dash's own decoding and encoding of callback requests"""
+    from flask import Response, request
+
+    @server.before_request
+    def start_request_timer():
+        _local.request_started = time.perf_counter()
+        _local.finished = None
+
+    @server.after_request
+    def record_response_time(response):
+        finished = getattr(_local, 'finished', None)
+        if request.path.endswith(UPDATE_PATH) and finished is not None:
+            callback, callback_seconds = finished
+            total = time.perf_counter() - _local.request_started
+            STAGE_SECONDS.observe((callback, 'response'), max(total - callback_seconds, 0.0))
+        return response
+
+    def metrics_view():
+        return Response(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    server.add_url_rule(path, 'metrics', metrics_view)
@@ -0,0 +1,292 @@
+import cProfile
+import functools
+import hashlib
+import hmac
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+TOKEN_HEADER = 'X-Profile-Token'
+DEFAULT_DIR = os.path.join('.dashboard_cache', 'profiles')
+DUMP_SUFFIXES = ('.pstats', '.folded', '.json')
+
+
+class ProfileSettings:
+    """What to profile, how often, and where the dumps go
+
+    callbacks names the callbacks profiled without being asked ('*' for all).
+    Each of them gets one deterministic cProfile run per rate window, and any
+    other call that runs past slow_ms has its stack sampled until it returns.
+    With a header_token set, a request carrying the X-Profile header and that
+    token in X-Profile-Token is profiled whatever its callback, under the same
+    rate limit; without one the header is ignored. The oldest dumps are
+    deleted once the directory holds more than max_dumps.
+    """
+
+    def __init__(self, callbacks=(), per_minute=1.0, slow_ms=250.0, interval_ms=5.0, directory=DEFAULT_DIR,
+                 header_token=None, max_dumps=200):
+        self.callbacks = frozenset(callbacks)
+        self.per_minute = per_minute
+        self.slow_ms = slow_ms
+        self.interval_ms = interval_ms
+        self.directory = directory
+        self.header_token = header_token or None
+        self.max_dumps = max_dumps
+
+    @classmethod
+    def from_env(cls, environ=None):
+        environ = os.environ if environ is None else environ
+        callbacks = [name.strip() for name in environ.get('DASHBOARD_PROFILE', '').split(',') if name.strip()]
+        return cls(
+            callbacks=callbacks,
+            per_minute=float(environ.get('DASHBOARD_PROFILE_RATE', 1.0)),
+            slow_ms=float(environ.get('DASHBOARD_PROFILE_SLOW_MS', 250.0)),
+            interval_ms=float(environ.get('DASHBOARD_PROFILE_INTERVAL_MS', 5.0)),
+            directory=environ.get('DASHBOARD_PROFILE_DIR', DEFAULT_DIR),
+            header_token=environ.get('DASHBOARD_PROFILE_TOKEN'),
+            max_dumps=int(environ.get('DASHBOARD_PROFILE_MAX_DUMPS', 200)),
+        )
+
+    def selects(self, callback):
+        return '*' in self.callbacks or callback in self.callbacks
+
+
+class RateLimiter:
+    """Token bucket per key: up to per_minute captures a minute, with bursts of the same size"""
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        if self.per_minute <= 0:
+            return False
+        now = time.monotonic()
+        capacity = max(self.per_minute, 1.0)
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * self.per_minute / 60.0)
+            if tokens < 1.0:
+                self._buckets[key] = (tokens, now)
+                return False
+            self._buckets[key] = (tokens - 1.0, now)
+            return True
+
+
+class _SampledCall:
+    def __init__(self, thread_id, code, started):
+        self.thread_id = thread_id
+        self.code = code
+        self.started = started
+        self.stacks = {}
+
+    def sample(self, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+            if code is self.code:
+                break
+            frame = frame.f_back
+        stack = ';'.join(reversed(names))
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+
+class SlowCallSampler:
+    """Samples the stacks of calls that have been running longer than a threshold
+
+    Calls that finish under the threshold cost two dict operations; only
+    outliers are walked, every interval, from a single daemon thread.
+    """
+
+    def __init__(self, slow_seconds, interval_seconds):
+        self.slow_seconds = slow_seconds
+        self.interval_seconds = interval_seconds
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def begin(self, code):
+        call = _SampledCall(threading.get_ident(), code, time.perf_counter())
+        with self._lock:
+            self._calls[call.thread_id] = call
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='callback-sampler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return call
+
+    def end(self, call):
+        with self._lock:
+            self._calls.pop(call.thread_id, None)
+        return call.stacks
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval_seconds)
+            with self._lock:
+                calls = list(self._calls.values())
+                if not calls:
+                    self._wake.clear()
+                    continue
+            now = time.perf_counter()
+            frames = sys._current_frames()
+            for call in calls:
+                frame = frames.get(call.thread_id)
+                if frame is not None and now - call.started >= self.slow_seconds:
+                    call.sample(frame)
+
+
+class CallbackProfiler:
+    def __init__(self, settings):
+        self.settings = settings
+        self.limiter = RateLimiter(settings.per_minute)
+        self.sampler = SlowCallSampler(settings.slow_ms / 1000.0, settings.interval_ms / 1000.0)
+        # One deterministic profile at a time: newer Pythons allow a single active profiler per process.
+        self._profile_lock = threading.Lock()
+
+    def wrap(self, callback):
+        name = callback.__name__
+        parameters = list(inspect.signature(callback).parameters)
+        code = callback.__code__
+
+        @functools.wraps(callback)
+        def wrapper(*args, **kwargs):
+            selected = self.settings.selects(name)
+            requested = self.settings.header_token is not None and _header_requests(name, self.settings.header_token)
+            if not selected and not requested:
+                return callback(*args, **kwargs)
+
+            inputs = dict(zip(parameters, args), **kwargs)
+            # Take the lock first, so a call that cannot profile does not spend a token.
+            if self._profile_lock.acquire(blocking=False):
+                try:
+                    if self.limiter.allow((name, 'profile')):
+                        return self._profile(name, 'header' if requested else 'rate', inputs, callback, args, kwargs)
+                finally:
+                    self._profile_lock.release()
+            if not selected or self.settings.slow_ms <= 0:
+                return callback(*args, **kwargs)
+
+            call = self.sampler.begin(code)
+            try:
+                return callback(*args, **kwargs)
+            finally:
+                stacks = self.sampler.end(call)
+                if stacks and self.limiter.allow((name, 'slow')):
+                    seconds = time.perf_counter() - call.started
+                    self._write(name, 'slow', inputs, seconds, '.folded', lambda path: _write_folded(path, stacks))
+
+        return wrapper
+
+    def _profile(self, name, trigger, inputs, callback, args, kwargs):
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            return profile.runcall(callback, *args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - started
+            self._write(name, trigger, inputs, seconds, '.pstats', profile.dump_stats)
+
+    def _write(self, name, trigger, inputs, seconds, suffix, dump):
+        """Write one dump plus a JSON sidecar, named <callback>-<time>-<input hash>"""
+        encoded = json.dumps(inputs, sort_keys=True, default=str)
+        digest = hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:10]
+        now = time.time()
+        stem = f"{name}-{time.strftime('%Y%m%dT%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}-{digest}"
+        path = os.path.join(self.settings.directory, stem)
+        try:
+            os.makedirs(self.settings.directory, exist_ok=True)
+            dump(path + suffix)
+            with open(path + '.json', 'w', encoding='utf-8') as handle:
+                json.dump({
+                    'callback': name,
+                    'trigger': trigger,
+                    'seconds': seconds,
+                    'inputs': json.loads(encoded),
+                    'inputs_hash': digest,
+                    'dump': stem + suffix,
+                }, handle, indent=1)
+        except OSError as error:
+            logger.warning('Could not write profile %s: %s', path, error)
+        self._prune()
+
+    def _prune(self):
+        """Delete the oldest dumps, with their sidecars, beyond max_dumps"""
+        if self.settings.max_dumps <= 0:
+            return
+        directory = self.settings.directory
+        try:
+            names = [name for name in os.listdir(directory) if name.endswith(DUMP_SUFFIXES)]
+            stems = {}
+            for name in names:
+                stem = os.path.splitext(name)[0]
+                mtime = os.stat(os.path.join(directory, name)).st_mtime_ns
+                stems[stem] = max(stems.get(stem, 0), mtime)
+            for stem in sorted(stems, key=stems.get)[:-self.settings.max_dumps]:
+                for suffix in DUMP_SUFFIXES:
+                    path = os.path.join(directory, stem + suffix)
+                    if os.path.exists(path):
+                        os.remove(path)
+        except OSError as error:
+            logger.warning('Could not prune profiles in %s: %s', directory, error)
+
+
+def _header_requests(callback, token):
+    """True when the current request carries the token and asks for this callback: `X-Profile: 1` or a list of names"""
+    try:
+        from flask import has_request_context, request
+    except ImportError:
+        return False
+    if not has_request_context():
+        return False
+    if not hmac.compare_digest(request.headers.get(TOKEN_HEADER, '').encode('utf-8'), token.encode('utf-8')):
+        return False
+    value = request.headers.get(PROFILE_HEADER, '').strip()
+    if not value or value == '0':
+        return False
+    names = {name.strip() for name in value.split(',')}
+    return bool(names & {'1', '*', callback})
+
+
+def _write_folded(path, stacks):
+    """Collapsed stacks, one `frame;frame;frame count` line each, as flamegraph.pl and speedscope read them"""
+    with open(path, 'w', encoding='utf-8') as handle:
+        for stack, count in sorted(stacks.items()):
+            handle.write(f'{stack} {count}\n')
+
+
+_profiler = None
+
+
+def configure_profiling(settings=None):
+    """Install profiling settings, read from DASHBOARD_PROFILE* environment variables by default"""
+    global _profiler
+    _profiler = CallbackProfiler(settings if settings is not None else ProfileSettings.from_env())
+    return _profiler
+
+
+def profiled(callback):
+    """Profile a callback under whatever settings are installed when it runs"""
+    current = [None, callback]
+
+    @functools.wraps(callback)
+    def wrapper(*args, **kwargs):
+        profiler = _profiler
+        if profiler is None:
+            return callback(*args, **kwargs)
+        if current[0] is not profiler:
+            current[:] = [profiler, profiler.wrap(callback)]
+        return current[1](*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,31 @@
+import json
+
+import plotly.io as pio
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def use_fast_json():
+    """Serialize figures and callback responses with orjson when it is installed
+
+    Dash encodes responses through plotly.io.json, so this one switch covers
+    both. Either engine writes numeric numpy arrays as base64 typed arrays.
+    """
+    if orjson is not None:
+        pio.json.config.default_engine = 'orjson'
+    return pio.json.config.default_engine
+
+
+def figure_to_json(figure):
+    if hasattr(figure, 'to_plotly_json'):
+        figure = figure.to_plotly_json()
+    return pio.json.to_json_plotly(figure)
+
+
+def loads(payload):
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
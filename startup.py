@@ -0,0 +1,88 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundLoader:
+    """Stands in for the DataLoader while it loads on a background thread
+
+    Callbacks are registered against this object at startup and reach the
+    real loader through attribute access once it exists. data.py, and with
+    it pandas, is only imported on the loading thread, so the server starts
+    answering requests straight away. It reports ready only after on_ready
+    returns, so the first page load finds the figure cache already warm.
+    """
+
+    def __init__(self, file_path, **options):
+        self.file_path = file_path
+        self.options = options
+        self.loader = None
+        self.error = None
+        self.started = None
+        self.loaded = None
+        self._ready = threading.Event()
+        self._done = threading.Event()
+        self._thread = None
+
+    def __getattr__(self, name):
+        loader = self.__dict__.get('loader')
+        if loader is None:
+            raise RuntimeError(f'{self.__dict__.get("file_path")} is still loading')
+        return getattr(loader, name)
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def load(self, on_ready=None):
+        """Import the data layer and load the snapshot on this thread; ready is set once on_ready returns"""
+        self.started = time.perf_counter()
+        try:
+            from data import DataLoader
+
+            loader = DataLoader(self.file_path, **self.options)
+        except Exception as error:
+            self.error = error
+            logger.exception('Loading %s failed', self.file_path)
+            self._done.set()
+            return
+        # Published before on_ready, so warmers can reach it through this proxy.
+        self.loader = loader
+        try:
+            if on_ready is not None:
+                on_ready(loader)
+        finally:
+            self.loaded = time.perf_counter()
+            self._ready.set()
+            self._done.set()
+        logger.info('%s ready %.2fs after startup', self.file_path, self.loaded - self.started)
+
+    def start(self, on_ready=None):
+        self._thread = threading.Thread(target=self.load, args=(on_ready,), name='portfolio-loader', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def status(self):
+        if self.ready:
+            return {'ready': True, 'version': self.loader.version, 'seconds': round(self.loaded - self.started, 3)}
+        if self.error is not None:
+            return {'ready': False, 'error': str(self.error)}
+        if self.loader is not None:
+            return {'ready': False, 'warming': self.file_path, 'version': self.loader.version}
+        return {'ready': False, 'loading': self.file_path}
+
+
+def register_ready_route(server, is_ready, status=None, path='/ready'):
+    """Serve 200 once is_ready() is true and 503 before, for load balancer readiness checks"""
+    from flask import jsonify
+
+    def ready_view():
+        body = status() if status is not None else {'ready': is_ready()}
+        return jsonify(body), 200 if is_ready() else 503
+
+    server.add_url_rule(path, 'ready', ready_view)
@@ -0,0 +1,241 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: no multi-worker servers to coordinate
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STORE_FORMAT = 4
+META_FILE = 'meta.json'
+HASH_CHUNK = 1 << 20
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ColumnStore:
+    """Binary columnar tables derived from a source workbook, one .npy file per column
+
+    Columns are opened memory-mapped and read-only, so every process serving
+    the same store shares one copy of the data through the page cache.
+    deltas records the delta files folded into the tables, as saved with them,
+    and built_ns when the store was written; every worker mapping the store
+    reads the same values.
+    """
+
+    def __init__(self, source_path, store_dir=None):
+        self.source_path = os.path.abspath(source_path)
+        if store_dir is None:
+            store_dir = os.path.join(
+                os.path.dirname(self.source_path),
+                '.dashboard_cache',
+                os.path.basename(self.source_path),
+            )
+        self.store_dir = store_dir
+        self.info = None
+        self.source = None
+        self.deltas = []
+        self.built_ns = None
+
+    def source_key(self, content_hash=None):
+        stat = os.stat(self.source_path)
+        return {
+            'path': self.source_path,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': content_hash,
+        }
+
+    def load(self):
+        """Return the stored tables by name, or None when the store is missing or stale"""
+        meta = self._read_meta()
+        if meta is None or meta.get('format') != STORE_FORMAT:
+            return None
+
+        key = self.source_key()
+        stored = meta['source']
+        if stored['path'] != key['path'] or stored['size'] != key['size']:
+            return None
+        if stored['mtime_ns'] != key['mtime_ns']:
+            # Touched or copied without changes: trust the content hash.
+            key['sha256'] = file_sha256(self.source_path)
+            if key['sha256'] != stored['sha256']:
+                return None
+            meta['source'] = key
+            try:
+                self._write_meta(self.store_dir, meta)
+            except OSError:
+                pass
+
+        try:
+            tables = {name: self._read_table(table) for name, table in meta['tables'].items()}
+            self.info = meta.get('info')
+            self.source = meta['source']
+            self.deltas = [tuple(delta) for delta in meta.get('deltas', [])]
+            self.built_ns = meta.get('built_ns')
+            return tables
+        except (OSError, ValueError, KeyError) as error:
+            logger.warning('Discarding unreadable column store %s: %s', self.store_dir, error)
+            return None
+
+    @contextlib.contextmanager
+    def build_lock(self):
+        """Hold an exclusive lock so only one process converts the workbook at a time"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.store_dir), exist_ok=True)
+        with open(f'{self.store_dir}.lock', 'w') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def save(self, tables, info=None, deltas=()):
+        """Write the named frames as the store for the current source file, replacing any old one"""
+        key = self.source_key()
+        known = self.source
+        if known and known.get('sha256') and (known['size'], known['mtime_ns']) == (key['size'], key['mtime_ns']):
+            # Folding deltas into a store of an unchanged workbook: no need to hash it again.
+            key['sha256'] = known['sha256']
+        else:
+            key['sha256'] = file_sha256(self.source_path)
+        # Known even when the write below fails, so the caller can still name the data.
+        self.source = key
+        self.built_ns = None
+        parent = os.path.dirname(self.store_dir)
+        try:
+            os.makedirs(parent, exist_ok=True)
+            tmp_dir = tempfile.mkdtemp(prefix='.build-', dir=parent)
+        except OSError as error:
+            logger.warning('Column store disabled, cannot write %s: %s', parent, error)
+            return False
+
+        try:
+            meta = {
+                'format': STORE_FORMAT,
+                'source': key,
+                'tables': {name: self._write_table(tmp_dir, name, df) for name, df in tables.items()},
+                'info': info,
+                'deltas': [list(delta) for delta in deltas],
+                'built_ns': time.time_ns(),
+            }
+            self._write_meta(tmp_dir, meta)
+            self._swap_in(tmp_dir)
+            self.info = info
+            self.deltas = [tuple(delta) for delta in deltas]
+            self.built_ns = meta['built_ns']
+        except OSError as error:
+            logger.warning('Failed to write column store %s: %s', self.store_dir, error)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+        return True
+
+    def _swap_in(self, tmp_dir):
+        trash = None
+        if os.path.exists(self.store_dir):
+            trash = tempfile.mkdtemp(prefix='.old-', dir=os.path.dirname(self.store_dir))
+            os.replace(self.store_dir, os.path.join(trash, 'store'))
+        os.replace(tmp_dir, self.store_dir)
+        if trash:
+            shutil.rmtree(trash, ignore_errors=True)
+
+    def _write_table(self, directory, table, df):
+        columns = [
+            self._write_column(directory, f'{table}_{position:03d}', name, df[name])
+            for position, name in enumerate(df.columns)
+        ]
+        return {'rows': len(df), 'columns': columns}
+
+    def _write_column(self, directory, prefix, name, series):
+        entry = {'name': name}
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            entry['kind'] = 'datetime'
+            arrays = {'values': series.to_numpy(dtype='datetime64[ns]')}
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            entry['kind'] = 'category'
+            arrays = {
+                'codes': series.cat.codes.to_numpy(),
+                'categories': np.asarray([str(v) for v in series.cat.categories], dtype=str),
+            }
+        elif pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+            entry['kind'] = 'numeric'
+            arrays = {'values': series.to_numpy()}
+        else:
+            entry['kind'] = 'text'
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            arrays = {
+                'codes': codes.astype(np.int32),
+                'categories': np.asarray([str(v) for v in uniques], dtype=str),
+            }
+
+        entry['files'] = {}
+        for part, values in arrays.items():
+            file_name = f'{prefix}_{part}.npy'
+            np.save(os.path.join(directory, file_name), values, allow_pickle=False)
+            entry['files'][part] = file_name
+        return entry
+
+    def _read_table(self, table):
+        data = {}
+        for entry in table['columns']:
+            arrays = {
+                part: self._map_array(os.path.join(self.store_dir, file_name))
+                for part, file_name in entry['files'].items()
+            }
+            if entry['kind'] == 'text':
+                codes = arrays['codes']
+                values = np.full(len(codes), np.nan, dtype=object)
+                present = codes >= 0
+                values[present] = arrays['categories'].astype(object)[codes[present]]
+                data[entry['name']] = values
+            elif entry['kind'] == 'category':
+                dtype = pd.CategoricalDtype(arrays['categories'].astype(object))
+                data[entry['name']] = pd.Categorical.from_codes(arrays['codes'], dtype=dtype)
+            else:
+                data[entry['name']] = arrays['values']
+
+        # copy=False keeps every column on its mapped file instead of consolidating into new blocks.
+        df = pd.DataFrame(data, copy=False)
+        if len(df) != table['rows']:
+            raise ValueError(f"expected {table['rows']} rows, found {len(df)}")
+        return df
+
+    def _map_array(self, path):
+        try:
+            return np.load(path, mmap_mode='r', allow_pickle=False)
+        except ValueError:
+            # Zero-length arrays cannot be mapped.
+            return np.load(path, allow_pickle=False)
+
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.store_dir, META_FILE), encoding='utf-8') as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, directory, meta):
+        path = os.path.join(directory, META_FILE)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            json.dump(meta, handle)
+        os.replace(tmp_path, path)